@@ -1,8 +1,26 @@
 # app.py
 from __future__ import annotations
-import os, json, requests
-from datetime import datetime
+import time
+_t_rerun = time.perf_counter()
+import hmac, logging, os
+from typing import TYPE_CHECKING
 import streamlit as st
+from dedupe import DedupeCache, idempotency_key
+from delivery import DeliveryConfig, WebhookSender
+from metrics import REGISTRY, SESSIONS, serve as serve_metrics
+from outbox import Outbox, OutboxFlusher
+from quoting import (MAX_CANT, MAX_MEDIDA_CM, MAX_PESO_BULTO_KG, MAX_VALOR_USD, PesosIncrementales, build_payload, compare_carriers, compute_pesos,
+                     error_bultos, load_carriers, error_productos, pais_final, producto_valido, to_float)
+from ratelimit import TokenBucketLimiter, client_address, parse_networks
+from state_model import BultosStore, ProductosStore
+from submission_log import SubmissionLog
+from startup import PROFILE
+from tariffs import TariffBook
+from validation import ValidacionIncremental, estado_bulto
+# pandas (tablas, importación) e importer se cargan recién cuando se usan: no pesan en el arranque en frío
+if TYPE_CHECKING: import pandas as pd
+PROFILE.phase("imports", time.perf_counter() - _t_rerun)  # sólo cuenta el primer run del proceso
+log = logging.getLogger("globaltrip.app")
 
 # -------------------- Config --------------------
 st.set_page_config(
@@ -12,145 +30,89 @@ st.set_page_config(
     initial_sidebar_state="collapsed",
 )
 
+def get_setting(name, default=""):
+    try:
+        return st.secrets.get(name, os.getenv(name, default))
+    except Exception:  # sin secrets.toml
+        return os.getenv(name, default)
+
+# ---- Admisión por cliente (antes de cualquier widget o CSS) ----
+@st.cache_resource
+def get_limiters() -> dict[str, TokenBucketLimiter]:
+    # GT_PING_PER_MIN / GT_PING_BURST, GT_PAGE_..., GT_SUBMIT_...
+    limiters = {
+        name: TokenBucketLimiter(
+            per_minute=float(get_setting(f"GT_{name.upper()}_PER_MIN", per_min)),
+            burst=float(get_setting(f"GT_{name.upper()}_BURST", burst)),
+        )
+        for name, per_min, burst in (("ping", 12, 3), ("page", 120, 60), ("submit", 6, 3))
+    }
+    REGISTRY.gauge("gt_ratelimit_rejected_total", "Pedidos rechazados por el rate limit.",
+                   lambda: {(("kind", k),): l.rejected for k, l in limiters.items()}, kind="counter")
+    return limiters
+
+@st.cache_resource
+def trusted_proxies() -> tuple:
+    # GT_TRUSTED_PROXIES: IPs/redes del proxy de la plataforma; sólo a ellas se les cree X-Forwarded-For
+    return parse_networks(str(get_setting("GT_TRUSTED_PROXIES", "")))
+
+def client_id() -> str:
+    # La IP de la conexión (None si viene de localhost); si es un proxy de confianza, el salto que agregó
+    # st.context.ip_address existe desde Streamlit 1.45 (requirements.txt): sin él no hay forma de identificar al cliente
+    fwd = st.context.headers.get("X-Forwarded-For", "")
+    peer = st.context.ip_address
+    ip = client_address(peer or "127.0.0.1", fwd if isinstance(fwd, str) else "", trusted_proxies())
+    if ip == "127.0.0.1" and not peer: return session_id()  # desarrollo local sin proxy
+    return ip
+
+def session_id() -> str:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "anon"
+
+
+def admitted(kind: str) -> bool:
+    return get_limiters()[kind].allow(client_id())
+
 # ---- Keepalive ultra liviano (para UptimeRobot, cron, etc.) ----
 if "ping" in st.query_params:
-    st.write("ok")
+    st.write("ok" if admitted("ping") else "busy")
     st.stop()
 
-# -------------------- Estilos --------------------
-st.markdown("""
-<style>
-:root{
-  --ink:#0e1b3d; --muted:#6b7280; --bg:#fff; --border:#e6ebf3;
-  --shadow:0 6px 16px rgba(17,24,39,.06); --radius:14px;
-  --s0:6px; --s1:8px; --s2:12px; --s3:16px;
-}
-
-/* Reset & layout */
-[data-testid="stHeader"], [data-testid="stToolbar"], #MainMenu, footer, header,
-div[data-testid="stDecoration"]{ display:none !important; }
-html, body, .stApp, [data-testid="stAppViewContainer"], section.main{
-  background:var(--bg) !important; color:var(--ink) !important;
-}
-section.main > div.block-container{ padding-top:8px !important; padding-bottom:var(--s3) !important; }
-
-/* Tipografía */
-h1,h2,h3,h4,h5,h6{ margin:8px 0 6px !important; color:var(--ink) !important; }
-.stCaption{ margin:0 0 6px !important; color:var(--muted) !important; }
-label{ margin-bottom:4px !important; }
-
-/* Secciones contenedor */
-.gt-section{ max-width:1100px; margin:0 auto; }
-.soft-card{
-  background:#fff; border:1.5px solid var(--border); border-radius:var(--radius);
-  padding:var(--s2); box-shadow:0 8px 18px rgba(17,24,39,.07); margin:10px 0 var(--s3);
-}
-
-/* Divisores */
-.gt-divider{
-  height:1px; width:100%; margin:14px 0 18px;
-  background:linear-gradient(90deg, rgba(14,27,61,.08), rgba(14,27,61,.03), rgba(14,27,61,.08));
-  border-radius:1px;
-}
-.gt-item-divider{
-  height:1px; width:100%; background:#eef2f9; margin:8px 0 10px; border-radius:1px;
-}
-
-/* Gaps */
-div[data-testid="stVerticalBlock"]{ gap:8px !important; }
-div[data-testid="stHorizontalBlock"]{ gap:10px !important; }
-div[data-testid="column"]{ padding:0 !important; }
-
-/* Inputs */
-div[data-testid="stTextInput"] input,
-div[data-testid="stTextArea"] textarea{
-  background:#fff !important; color:var(--ink) !important;
-  border:1.5px solid var(--border) !important; border-radius:var(--radius) !important;
-  padding:10px var(--s2) !important; box-shadow:none !important;
-}
-div[data-testid="stTextInput"] input::placeholder,
-div[data-testid="stTextArea"] textarea::placeholder{ color:#94a3b8 !important; }
-textarea{ min-height:80px !important; }
-
-/* NumberInput */
-div[data-testid="stNumberInput"] > div{
-  background:#fff !important; border:1.5px solid var(--border) !important; border-radius:24px !important; box-shadow:none !important;
-}
-div[data-testid="stNumberInput"] input{
-  background:#fff !important; color:var(--ink) !important; height:42px !important; padding:0 var(--s2) !important; border:none !important;
-}
-div[data-testid="stNumberInput"] > div > div:nth-child(2){
-  background:#fff !important; border-left:1.5px solid var(--border) !important; border-radius:0 24px 24px 0 !important; padding:2px !important;
-}
-div[data-testid="stNumberInput"] button{
-  background:#eef3ff !important; color:var(--ink) !important; border:1px solid var(--border) !important;
-  border-radius:10px !important; box-shadow:none !important;
-}
-
-/* Botones */
-div.stButton{ margin:0 !important; }
-div.stButton > button{
-  width:100%; background:#f7faff !important; color:var(--ink) !important;
-  border:1.5px solid var(--border) !important; border-radius:var(--radius) !important;
-  padding:10px var(--s2) !important; box-shadow:var(--shadow) !important;
-}
-div.stButton > button:hover{ background:#eef3ff !important; }
-#gt-submit-btn button{ width:100% !important; }
-
-/* Pills/resúmenes */
-.gt-pill{
-  display:inline-flex; align-items:center; gap:8px;
-  background:#fff; border:1.5px solid var(--border); border-radius:12px;
-  padding:10px 12px; box-shadow:var(--shadow); margin-bottom:6px !important;
-}
-
-/* Radios */
-[data-testid="stRadio"]{ margin-top:4px !important; margin-bottom:8px !important; }
-[data-testid="stRadio"] > label{ color:var(--muted) !important; font-weight:500 !important; margin-bottom:4px !important; }
-[data-testid="stRadio"] div[role="radiogroup"]{ display:flex !important; align-items:center !important; gap:12px !important; }
-[data-testid="stRadio"] label p{ margin:0 !important; font-size:0.95rem !important; color:var(--ink) !important; }
-[data-testid="stRadio"] input[type="radio"]{ transform:scale(0.9); accent-color:#0e1b3d; }
-
-/* ===== Popup estilo liviano ===== */
-.gt-overlay{
-  position:fixed; inset:0; background:rgba(14,27,61,.45); backdrop-filter: blur(2.5px);
-  display:flex; align-items:center; justify-content:center; z-index:9999;
-}
-.gt-modal{
-  position:relative; width:min(720px, 94vw);
-  background:#fff; border:1px solid #e8eef7; border-radius:24px;
-  box-shadow:0 20px 65px rgba(14,27,61,.14); padding:24px 28px; animation:gt-pop .18s ease-out;
-}
-.gt-title{ margin:0 0 8px !important; font-size:30px; color:var(--ink); }
-.gt-body p{ margin:10px 0; color:#1f2a44; line-height:1.55; }
-.gt-body a{ color:#2563eb; text-decoration:underline; }
-.gt-actions{ display:flex; gap:14px; margin-top:18px; flex-wrap:wrap; }
-.gt-btn{
-  display:inline-flex; align-items:center; gap:8px; padding:14px 18px; border-radius:16px;
-  background:#edf3ff; border:1.5px solid #cfe0ff; color:var(--ink) !important;
-  text-decoration:underline; font-weight:600;
-}
-.gt-btn:hover{ background:#e7efff; color:var(--ink) !important; }
-.gt-btn.secondary{ background:#f6f8ff; border-color:#dbe6ff; color:var(--ink) !important; }
-.gt-close{
-  position:absolute; top:14px; right:14px; width:40px; height:40px; border-radius:12px;
-  display:grid; place-items:center; background:#f6f8ff; border:1px solid #dbe6ff; color:#2a6ae6; text-decoration:none; font-size:20px;
-}
-.gt-close:hover{ background:#eef3ff; }
-@keyframes gt-pop{ from{ transform:translateY(6px); opacity:.0 } to{ transform:translateY(0); opacity:1 } }
-div[data-testid="stTextInput"] label,
-div[data-testid="stNumberInput"] label,
-div[data-testid="stTextArea"] label{
-  color:var(--ink) !important; font-weight:600 !important;
-}
-</style>
-""", unsafe_allow_html=True)
+# ---- Perfil de arranque en frío (JSON) ----
+if "startup" in st.query_params:
+    if admitted("ping"): st.json(PROFILE.report())
+    else: st.write("busy")
+    st.stop()
+
+if not admitted("page"):
+    st.warning("Demasiadas recargas seguidas. Esperá unos segundos y volvé a intentar.")
+    st.stop()
+
+# -------------------- Estilos y encabezado --------------------
+@st.cache_resource
+def static_markup() -> str:
+    # CSS, header y leyenda no cambian entre reruns: se leen y arman una vez por proceso y van en un solo elemento
+    with open(os.path.join(os.path.dirname(__file__), "assets", "styles.css"), encoding="utf-8") as f:
+        css = f.read()
+    return f"<style>\n{css}</style>\n{HEADER_HTML}\n{LEYENDA_HTML}\n{DIVIDER}"
 
 # -------------------- Estado --------------------
-FACTOR_VOL = 5000
+PAGE_SIZE = 10  # filas por página en la vista de formulario
+# Keys de widget por fila: prefijo + id estable de la fila (ver state_model)
+BULTO_KEYS = ["cant_", "an_", "al_", "lar_", "del_row_"]
+PRODUCTO_KEYS = ["prod_desc_", "prod_link_", "del_prod_"]
+# Bytes aproximados que suma una fila nueva, para el tope de memoria por sesión
+BULTO_ROW_BYTES = 32
+PRODUCTO_ROW_BYTES = 64
+
 def init_state():
-    st.session_state.setdefault("rows", [{"cant":0, "ancho":0, "alto":0, "largo":0}])
-    st.session_state.setdefault("productos", [{"descripcion":"", "link":""}])
+    if "bultos" not in st.session_state:
+        st.session_state.bultos = BultosStore()
+        st.session_state.bultos.append()
+    if "productos" not in st.session_state:
+        st.session_state.productos = ProductosStore()
+        st.session_state.productos.append()
     st.session_state.setdefault("nombre","")
     st.session_state.setdefault("email","")
     st.session_state.setdefault("telefono","")
@@ -162,285 +124,706 @@ def init_state():
     st.session_state.setdefault("valor_mercaderia",0.0)
     st.session_state.setdefault("show_dialog", False)
     st.session_state.setdefault("form_errors", [])
+    st.session_state.setdefault("intento_envio", False)  # tras el primer intento se marcan también los campos vacíos
+    if "pesos_inc" not in st.session_state:
+        st.session_state.pesos_inc = PesosIncrementales(st.session_state.bultos.bultos())
+    if "validacion" not in st.session_state:
+        st.session_state.validacion = ValidacionIncremental(st.session_state.bultos, st.session_state.productos)
 init_state()
 
 # -------------------- Helpers --------------------
-def to_float(s, default=0.0):
+@st.cache_resource
+def get_sender() -> WebhookSender:
+    # Uno por proceso: sesión HTTP keep-alive y pool de workers compartidos entre sesiones
+    sender = WebhookSender(DeliveryConfig(
+        workers=int(get_setting("N8N_WORKERS", 4)),
+        timeout=float(get_setting("N8N_TIMEOUT", 10)),
+        max_retries=int(get_setting("N8N_MAX_RETRIES", 3)),
+        max_inflight=int(get_setting("N8N_MAX_INFLIGHT", 64)),
+    ))
+    REGISTRY.gauge("gt_webhook_inflight", "Envíos al webhook en curso.", sender.inflight)
+    return sender
+
+def webhook_auth() -> dict:
+    # Se lee en cada envío: rotar N8N_TOKEN aplica también a lo que ya estaba encolado
+    token = get_setting("N8N_TOKEN")
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+@st.cache_resource
+def get_outbox() -> tuple[Outbox, OutboxFlusher]:
+    # Al arrancar el proceso el flusher drena lo que haya quedado pendiente de la corrida anterior
+    outbox = Outbox(get_setting("GT_OUTBOX_PATH", "data/outbox.sqlite3"))
+    flusher = OutboxFlusher(
+        outbox, get_sender(),
+        batch=str(get_setting("N8N_BATCH", "")).lower() in ("1", "true", "yes"),
+        batch_size=int(get_setting("N8N_BATCH_SIZE", 25)),
+        auth=webhook_auth,
+    )
+    REGISTRY.gauge("gt_outbox_depth", "Cotizaciones en el outbox esperando envío.", outbox.depth)
+    REGISTRY.gauge("gt_outbox_dead", "Cotizaciones rechazadas por el webhook (4xx), apartadas en outbox_dead (se reencolan desde ?admin).", outbox.dead)
+    return outbox, flusher
+
+def health_check(max_depth: int):
+    # Estado real del envío: flusher vivo, breaker del webhook y cuánto se acumuló en el outbox.
+    # Los recursos se resuelven acá (hilo del script): el handler HTTP corre sin contexto de Streamlit
+    if not get_setting("N8N_WEBHOOK_URL"):
+        return lambda: (True, {"webhook": "sin configurar"})
+    try:
+        (outbox, flusher), sender = get_outbox(), get_sender()
+    except Exception as e:
+        detalle = {"outbox": f"no se pudo abrir: {e}"}
+        return lambda: (False, detalle)
+    def health() -> tuple[bool, dict]:
+        depth, abiertos, vivo = outbox.depth(), sender.breakers_open(), flusher.alive()
+        return vivo and not abiertos and depth <= max_depth, {
+            "flusher": vivo, "breaker_abierto": abiertos, "outbox": depth, "outbox_max": max_depth, "outbox_dead": outbox.dead()}
+    return health
+
+@st.cache_resource
+def start_metrics_server():
+    # Opcional: /metrics y /health en un puerto aparte (Prometheus necesita text/plain, una página de Streamlit no sirve).
+    # Escucha en 127.0.0.1; para exponerlo (GT_METRICS_HOST) hace falta GT_METRICS_TOKEN
+    port = int(get_setting("GT_METRICS_PORT", 0))
+    if not port: return None
+    try:
+        return serve_metrics(port, host=str(get_setting("GT_METRICS_HOST", "127.0.0.1")),
+                             token=str(get_setting("GT_METRICS_TOKEN", "")),
+                             health=health_check(int(get_setting("GT_HEALTH_MAX_OUTBOX", 500))))
+    except (OSError, ValueError):
+        log.exception("no se pudo levantar el servidor de métricas")
+        return None
+start_metrics_server()
+def start_outbox():
+    # El outbox arranca con el proceso (no con el primer envío): lo que quedó encolado de la corrida anterior se drena ya.
+    # Si no abre (ruta inválida, disco lleno) la página sigue: el envío vuelve a intentarlo y le avisa al usuario
+    if not get_setting("N8N_WEBHOOK_URL"): return
     try:
-        return float(str(s).replace(",",".")) if s not in (None,"") else default
-    except:
-        return default
+        get_outbox()
+    except Exception:
+        log.exception("no se pudo abrir el outbox")
+start_outbox()
+
+@st.cache_resource
+def get_dedupe() -> DedupeCache:
+    cache = DedupeCache(
+        ttl=float(get_setting("GT_DEDUPE_TTL", 600)),
+        max_size=int(get_setting("GT_DEDUPE_MAX", 10_000)),
+    )
+    REGISTRY.gauge("gt_dedupe_lookups_total", "Consultas a la cache de idempotencia por resultado.",
+                   lambda: {(("result", k),): v for k, v in cache.stats().items() if k != "size"}, kind="counter")
+    return cache
+
+@st.cache_resource
+def get_tarifas() -> TariffBook | None:
+    # Opt-in: sin GT_TARIFAS_PATH (tarifario real) no se muestra ni se envía precio estimado.
+    # Se recompila solo cuando cambia el archivo; no hace falta reiniciar la app
+    path = get_setting("GT_TARIFAS_PATH")
+    if not path: return None
+    book = TariffBook(path)
+    REGISTRY.gauge("gt_tarifas_reloads_total", "Recompilaciones del tarifario.", lambda: book.reloads, kind="counter")
+    return book
+
+@st.cache_resource(show_spinner=False, max_entries=1)  # sólo la versión vigente del archivo
+def _couriers(path: str, stamp: int) -> tuple:
+    try:
+        return load_carriers(path)
+    except (OSError, ValueError, KeyError, TypeError):
+        log.exception("tabla de couriers inválida (%s)", path)
+        return ()
+
+def get_couriers() -> tuple:
+    # Opt-in como el tarifario: sin GT_COURIERS_PATH no hay comparación ni ranking en el payload.
+    # La cache va por mtime: editar el archivo aplica en el próximo rerun
+    path = get_setting("GT_COURIERS_PATH")
+    if not path: return ()
+    try:
+        return _couriers(path, os.stat(path).st_mtime_ns)
+    except OSError:
+        log.warning("no se encontró la tabla de couriers %s", path)
+        return ()
 
-def compute_total_vol(rows):
-    total = 0.0
-    for r in rows:
-        total += (to_float(r["cant"])*to_float(r["ancho"])*to_float(r["alto"])*to_float(r["largo"])) / FACTOR_VOL
-    return round(total, 2)
+@st.cache_resource
+def get_submission_log() -> SubmissionLog:
+    # Copia local de cada solicitud para encontrarla por email, teléfono, país o fecha (vista ?admin)
+    return SubmissionLog(get_setting("GT_SUBMISSIONS_PATH", "data/submissions.jsonl"))
 
 def post_to_webhook(payload: dict):
-    url = st.secrets.get("N8N_WEBHOOK_URL", os.getenv("N8N_WEBHOOK_URL",""))
-    token = st.secrets.get("N8N_TOKEN", os.getenv("N8N_TOKEN",""))
-    if not url: return True, "Sin webhook configurado."
-    headers = {"Content-Type":"application/json"}
-    if token: headers["Authorization"] = f"Bearer {token}"
+    # Doble click o rerun con la misma solicitud: ya está encolada, no se manda de nuevo.
+    # La key se marca al consultar (así dos clicks simultáneos no pasan los dos) y se libera si no se pudo guardar.
+    key = idempotency_key(payload)
+    if get_dedupe().seen(key):
+        REGISTRY.inc("gt_submissions_total", result="duplicate")
+        return True, "Duplicado."
+    url = get_setting("N8N_WEBHOOK_URL")
+    if url:
+        # Se persiste primero (no se pierde si falla el POST o se reinicia la app) y se envía en background.
+        # El token no se guarda con la entrada: el flusher lo agrega al enviar (ver webhook_auth).
+        try:
+            outbox, flusher = get_outbox()
+            outbox.append(url, payload, idem_key=key)
+        except Exception:
+            get_dedupe().forget(key)
+            raise
+        flusher.wake()
+    registrar(payload)
+    if not url:
+        REGISTRY.inc("gt_submissions_total", result="no_webhook")
+        return True, "Sin webhook configurado."
+    REGISTRY.inc("gt_submissions_total", result="enqueued")
+    return True, "Encolado."
+
+def registrar(payload: dict):
+    # El registro local es una copia para la vista ?admin: si falla, la solicitud ya está en el outbox
     try:
-        r = requests.post(url, headers=headers, data=json.dumps(payload), timeout=15)
-        return (r.ok, f"HTTP {r.status_code}")
-    except Exception as e:
-        return False, str(e)
-
-def validate():
-    errs = []
-    if not st.session_state.nombre.strip(): errs.append("• Nombre es obligatorio.")
-    if not st.session_state.email.strip() or "@" not in st.session_state.email: errs.append("• Email válido es obligatorio.")
-    if not st.session_state.telefono.strip(): errs.append("• Teléfono es obligatorio.")
-    if not any(p["descripcion"].strip() and p["link"].strip() for p in st.session_state.productos):
-        errs.append("• Cargá al menos un producto con descripción y link.")
-    if st.session_state.pais_origen == "Otro" and not (st.session_state.pais_origen_otro or "").strip():
-        errs.append("• Indicá el país de origen.")
-    if not any(
-        to_float(r["cant"])>0 and (to_float(r["ancho"])+to_float(r["alto"])+to_float(r["largo"]))>0
-        for r in st.session_state.rows
-    ):
-        errs.append("• Ingresá al menos un bulto con cantidad y medidas.")
-    return errs
+        get_submission_log().append(payload)
+    except Exception:
+        log.exception("no se pudo registrar la solicitud en el log local")
+
+def current_form() -> dict:
+    ss = st.session_state
+    return {
+        "nombre": ss.nombre, "email": ss.email, "telefono": ss.telefono,
+        "pais_origen": ss.pais_origen, "pais_origen_otro": ss.pais_origen_otro,
+        "productos": ss.productos.to_rows(), "bultos": ss.bultos.to_rows(),
+        "peso_bruto": ss.peso_bruto, "valor_mercaderia": ss.valor_mercaderia,
+    }
+
+def session_nbytes() -> int:
+    ss = st.session_state
+    total = ss.bultos.nbytes + ss.productos.nbytes
+    for lista in ("bultos", "productos"):
+        base = ss.get(f"{lista}_base")
+        if base is not None: total += int(base.memory_usage(deep=True).sum())
+    return total
+
+def hay_lugar(extra: int) -> bool:
+    # Tope por sesión para poder alojar muchos usuarios en una instancia chica
+    if session_nbytes() + extra <= int(get_setting("GT_SESSION_MAX_BYTES", 4_000_000)):
+        return True
+    st.session_state.limite_alcanzado = True
+    return False
+
+def aviso_limite():
+    if st.session_state.pop("limite_alcanzado", False):
+        st.warning("La solicitud es demasiado grande para cargarla acá. Escribinos y la cotizamos por mail.")
 
 # -------------------- Callbacks --------------------
+def forget_widgets(prefixes, rid=None):
+    """Borra las keys de widget de una fila (o de todas) para que no queden huérfanas en la sesión."""
+    if rid is not None:
+        for p in prefixes: st.session_state.pop(f"{p}{rid}", None)
+        return
+    for k in [k for k in st.session_state if isinstance(k, str) and k.startswith(tuple(prefixes))]:
+        del st.session_state[k]
+
 def add_row():
-    st.session_state.rows.append({"cant": 0, "ancho": 0, "alto": 0, "largo": 0})
+    if not hay_lugar(BULTO_ROW_BYTES): return
+    st.session_state.bultos.append()
+    st.session_state.bultos_page = (len(st.session_state.bultos) - 1) // PAGE_SIZE
 
 def clear_rows():
-    st.session_state.rows = [{"cant": 0, "ancho": 0, "alto": 0, "largo": 0}]
+    st.session_state.bultos.clear()
+    st.session_state.bultos.append()
+    st.session_state.pesos_inc = PesosIncrementales()
+    st.session_state.validacion.cargar_bultos(st.session_state.bultos)
+    forget_widgets(BULTO_KEYS)
+
+def del_row(rid):
+    ss = st.session_state
+    if len(ss.bultos) <= 1: return clear_rows()
+    i = ss.bultos.index(rid)
+    ss.pesos_inc.add(ss.bultos.row(i), -1)
+    ss.validacion.bulto(ss.bultos.row(i), None)
+    ss.bultos.pop(i)
+    forget_widgets(BULTO_KEYS, rid)
+
+def on_bulto_change(rid):
+    ss = st.session_state
+    i = ss.bultos.index(rid)
+    old = ss.bultos.row(i)
+    ss.bultos.set(i, {"cant": ss[f"cant_{rid}"], "ancho": ss[f"an_{rid}"], "alto": ss[f"al_{rid}"], "largo": ss[f"lar_{rid}"]})
+    ss.pesos_inc.update(old, ss.bultos.row(i))
+    ss.validacion.bulto(old, ss.bultos.row(i))
+
+def importar_bultos():
+    # Toda la lista entra al modelo en una sola actualización; no se arma un widget por fila
+    ss = st.session_state
+    archivo = ss.get("bultos_archivo")
+    if archivo is None: return
+    try:
+        res = PROFILE.lazy_import("importer").parse_packing_list(archivo.getvalue(), archivo.name,
+                                 max_filas=int(get_setting("GT_SESSION_MAX_BYTES", 4_000_000)) // BULTO_ROW_BYTES)
+    except ImportError:
+        ss.bultos_importados = "Para importar planillas de Excel falta instalar openpyxl. Probá con CSV."
+        return
+    except Exception as e:  # archivo roto, encabezados desconocidos o demasiadas filas
+        ss.bultos_importados = f"No pudimos leer el archivo: {e}"
+        return
+    if res.filas and not hay_lugar((res.filas - len(ss.bultos)) * BULTO_ROW_BYTES):
+        return  # no se cargó nada: sólo queda el aviso de límite (aviso_limite)
+    if res.filas:
+        ss.bultos.replace(res.columnas)
+        ss.pesos_inc = PesosIncrementales(ss.bultos.bultos())
+        ss.validacion.cargar_bultos(ss.bultos)
+        forget_widgets(BULTO_KEYS)
+        ss.bultos_page = 0
+        if ss.get("bultos_tabla"): on_modo_tabla("bultos", BULTO_KEYS)
+    ss.bultos_importados = res
+
+def aviso_importacion():
+    res = st.session_state.pop("bultos_importados", None)
+    if res is None: return
+    if isinstance(res, str):
+        st.error(res)
+        return
+    if res.filas:
+        st.success(f"Importamos {res.filas:,} bultos.")
+    else:
+        st.warning("El archivo no tiene bultos para importar.")
+    if res.total_errores:
+        lineas = "\n".join(f"- Línea {n}: {motivo}" for n, motivo in res.errores[:20])
+        resto = res.total_errores - min(len(res.errores), 20)
+        st.warning(f"{res.total_errores:,} filas con errores no se importaron:\n\n{lineas}"
+                   + (f"\n\n…y {resto:,} más." if resto else ""))
 
 def add_producto():
-    st.session_state.productos.append({"descripcion":"", "link":""})
+    if not hay_lugar(PRODUCTO_ROW_BYTES): return
+    st.session_state.productos.append()
+    st.session_state.productos_page = (len(st.session_state.productos) - 1) // PAGE_SIZE
 
 def clear_productos():
-    st.session_state.productos = [{"descripcion":"", "link":""}]
+    st.session_state.productos.clear()
+    st.session_state.productos.append()
+    st.session_state.validacion.cargar_productos(st.session_state.productos)
+    forget_widgets(PRODUCTO_KEYS)
+
+def del_producto(rid):
+    ss = st.session_state
+    if len(ss.productos) <= 1: return clear_productos()
+    i = ss.productos.index(rid)
+    ss.validacion.producto(ss.productos.row(i), None)
+    ss.productos.pop(i)
+    forget_widgets(PRODUCTO_KEYS, rid)
+
+def on_producto_change(rid):
+    ss = st.session_state
+    i = ss.productos.index(rid)
+    old = ss.productos.row(i)
+    ss.productos.set(i, {"descripcion": ss[f"prod_desc_{rid}"], "link": ss[f"prod_link_{rid}"]})
+    ss.validacion.producto(old, ss.productos.row(i))
+
+def ir_a_pagina(key, page):
+    st.session_state[key] = page
+
+def on_modo_tabla(lista, prefixes):
+    # Al entrar a la tabla fijamos el DataFrame base (el editor guarda sus cambios relativos a él);
+    # al salir, las keys por fila quedan viejas y se vuelven a sembrar desde el modelo.
+    ss = st.session_state
+    if ss[f"{lista}_tabla"]:
+        pd = PROFILE.lazy_import("pandas")
+        ss[f"{lista}_base"] = pd.DataFrame(ss[lista].columns(), copy=True)
+        ss.pop(f"{lista}_editor", None)
+    else:
+        ss.pop(f"{lista}_base", None)
+        ss.pop(f"{lista}_editor", None)
+        forget_widgets(prefixes)
+
+def on_tabla_editada(lista):
+    st.session_state[f"{lista}_dirty"] = True
+
+# -------------------- Admin: búsqueda de solicitudes --------------------
+ADMIN_PAGE_SIZE = 25
+
+def es_admin() -> bool:
+    # ?admin=<GT_ADMIN_TOKEN>; sin token configurado la vista no existe
+    token = get_setting("GT_ADMIN_TOKEN")
+    return bool(token) and hmac.compare_digest(str(st.query_params.get("admin", "")), str(token))
+
+def admin_view():
+    st.title("Solicitudes enviadas")
+    registro = get_submission_log()
+    ss = st.session_state
+    with st.form("admin_busqueda"):
+        c1, c2, c3 = st.columns(3)
+        email = c1.text_input("Email")
+        telefono = c2.text_input("Teléfono")
+        pais = c3.text_input("País de origen")
+        d1, d2 = st.columns(2)
+        desde = d1.date_input("Desde", value=None, format="DD/MM/YYYY")
+        hasta = d2.date_input("Hasta", value=None, format="DD/MM/YYYY")
+        if st.form_submit_button("Buscar"):
+            ss.admin_filtros = {"email": email, "telefono": telefono, "pais": pais, "desde": desde, "hasta": hasta}
+            ss.admin_cursores = [None]
+    # Un cursor por página visitada: "Anterior" vuelve al de la página previa sin recorrer desde el principio
+    cursores = ss.setdefault("admin_cursores", [None])
+    page, nxt = registro.search(**ss.get("admin_filtros", {}), limit=ADMIN_PAGE_SIZE, cursor=cursores[-1])
+    st.caption(f"Página {len(cursores)}")  # sin total: un COUNT(*) recorre todo el índice en cada render
+    if not page:
+        st.info("No hay solicitudes con esos filtros.")
+    else:
+        st.dataframe([{
+            "fecha": p.get("timestamp", ""), "nombre": (p.get("contacto") or {}).get("nombre", ""),
+            "email": (p.get("contacto") or {}).get("email", ""), "teléfono": (p.get("contacto") or {}).get("telefono", ""),
+            "país": p.get("pais_origen", ""), "aplicable (kg)": (p.get("pesos") or {}).get("aplicable_kg"),
+            "estimado": (p.get("estimacion") or {}).get("total"),
+        } for _, p in page], hide_index=True, use_container_width=True)
+        for off, p in page:
+            with st.expander(f"{p.get('timestamp', '')} · {(p.get('contacto') or {}).get('email', '')}"):
+                st.json(p)
+    a, _, b = st.columns([1, 2, 1])
+    with a: st.button("◀ Anterior", on_click=cursores.pop, disabled=len(cursores) == 1, use_container_width=True)
+    with b: st.button("Siguiente ▶", on_click=cursores.append, args=(nxt,), disabled=nxt is None, use_container_width=True)
+    if get_setting("N8N_WEBHOOK_URL"):
+        admin_rechazadas()
+
+def admin_rechazadas():
+    # outbox_dead: lo que el webhook rechazó (4xx). Una vez corregido el webhook se vuelve a encolar desde acá
+    outbox, flusher = get_outbox()
+    muertas = outbox.dead()
+    if not muertas: return
+    st.divider()
+    st.warning(f"{muertas:,} solicitudes rechazadas por el webhook esperan revisión (outbox_dead).")
+    if st.button("Reencolar rechazadas", key="admin_revive"):
+        n = outbox.revive()
+        flusher.wake()
+        st.success(f"{n:,} solicitudes vuelven a la cola de envío.")
+
+if "admin" in st.query_params:
+    if es_admin(): admin_view()
+    else: st.warning("Acceso no autorizado.")
+    st.stop()
 
 # -------------------- Header --------------------
-st.markdown("""
+HEADER_HTML = """
 <div class="soft-card gt-section">
   <h2 style="margin:0;">📦 Cotización de Importación por Courier</h2>
   <p style="margin:6px 0 0;">Completá tus datos e información de tu importación y te enviaremos la cotización por mail.</p>
 </div>
-""", unsafe_allow_html=True)
+"""
 
 # -------------------- Leyenda / Reglas --------------------
-st.markdown('<div class="gt-section">', unsafe_allow_html=True)
-st.markdown(
-    """
-<div class="soft-card" style="border-color:#dbe6ff;background:#f7faff">
+LEYENDA_HTML = """
+<div class="gt-section"><div class="soft-card" style="border-color:#dbe6ff;background:#f7faff">
   <p style="margin:0 0 6px;color:#0e1b3d;"><b>Recordá las reglas del courier:</b></p>
   <p style="margin:0;color:#0e1b3d;opacity:.95;"><i>
     El valor total de la compra no puede superar los <b>3000 dólares</b> y el
     <b>peso de cada bulto</b> no puede superar los <b>50 kilogramos brutos</b>.
   </i></p>
-</div>
-""",
-    unsafe_allow_html=True,
-)
-st.markdown('</div>', unsafe_allow_html=True)
-st.markdown('<div class="gt-section"><div class="gt-divider"></div></div>', unsafe_allow_html=True)
+</div></div>
+"""
+DIVIDER = '<div class="gt-section"><div class="gt-divider"></div></div>'
+
+st.markdown(static_markup(), unsafe_allow_html=True)
+
+def paginar(n, key) -> range:
+    """Muestra los controles de página (si hace falta) y devuelve los índices visibles."""
+    paginas = max(1, -(-n // PAGE_SIZE))
+    page = min(st.session_state.get(key, 0), paginas - 1)
+    if paginas > 1:
+        a, b, c = st.columns([1, 2, 1])
+        with a: st.button("◀ Anterior", key=f"{key}_prev", on_click=ir_a_pagina, args=(key, page - 1), disabled=page == 0, use_container_width=True)
+        with b: st.caption(f"Página {page + 1} de {paginas} · {n} en total")
+        with c: st.button("Siguiente ▶", key=f"{key}_next", on_click=ir_a_pagina, args=(key, page + 1), disabled=page == paginas - 1, use_container_width=True)
+    return range(page * PAGE_SIZE, min(n, (page + 1) * PAGE_SIZE))
+
+def editor_tabla(lista, column_config, vacio) -> pd.DataFrame | None:
+    """Vista de tabla: un único widget sin importar el largo de la lista. Devuelve la tabla si hubo cambios."""
+    edited = st.data_editor(
+        st.session_state[f"{lista}_base"], key=f"{lista}_editor", num_rows="dynamic",
+        hide_index=True, use_container_width=True, column_config=column_config,
+        on_change=on_tabla_editada, args=(lista,),
+    )
+    if st.session_state.pop(f"{lista}_dirty", False):
+        return edited.fillna(vacio)
+    return None
 
-# -------------------- Datos de contacto --------------------
-st.markdown('<div class="gt-section">', unsafe_allow_html=True)
-st.subheader("Datos de contacto")
-c1,c2,c3 = st.columns([1.1,1.1,1.0])
-with c1: st.session_state.nombre = st.text_input("Nombre completo*", value=st.session_state.nombre, placeholder="Ej: Juan Pérez")
-with c2: st.session_state.email = st.text_input("Correo electrónico*", value=st.session_state.email, placeholder="ejemplo@email.com")
-with c3: st.session_state.telefono = st.text_input("Teléfono*", value=st.session_state.telefono, placeholder="Ej: 11 5555 5555")
-st.markdown('</div>', unsafe_allow_html=True)
+def error_inline(err, mostrar: bool = True):
+    """Error bajo su campo: al completarlo mal, o en cualquier caso después del primer intento de envío."""
+    if err and (mostrar or st.session_state.intento_envio):
+        st.caption(f":red[{err if isinstance(err, str) else err.mensaje}]")
 
-st.markdown('<div class="gt-section"><div class="gt-divider"></div></div>', unsafe_allow_html=True)
+# Cada sección es un fragmento: editar un campo re-ejecuta sólo su sección, no toda la página.
+# Bultos y pesos comparten fragmento porque el peso aplicable depende de ambos.
 
-# -------------------- País de origen --------------------
-st.markdown('<div class="gt-section">', unsafe_allow_html=True)
-st.subheader("País de origen de los productos a cotizar")
-
-# Evitamos resets: controlamos sólo por 'key' y usamos el valor al final
-st.radio(
-    "Seleccioná el país de origen:",
-    ["China", "Otro"],
-    key="pais_origen",
-    horizontal=True
-)
+# -------------------- Datos de contacto --------------------
+@st.fragment
+@REGISTRY.timed("gt_section_seconds", section="contacto")
+def seccion_contacto():
+    st.markdown('<div class="gt-section">', unsafe_allow_html=True)
+    st.subheader("Datos de contacto")
+    c1,c2,c3 = st.columns([1.1,1.1,1.0])
+    ss, v = st.session_state, st.session_state.validacion
+    with c1:
+        ss.nombre = st.text_input("Nombre completo*", value=ss.nombre, placeholder="Ej: Juan Pérez")
+        error_inline(v.campo("nombre", ss.nombre), mostrar=False)
+    with c2:
+        ss.email = st.text_input("Correo electrónico*", value=ss.email, placeholder="ejemplo@email.com")
+        error_inline(v.campo("email", ss.email), mostrar=bool(ss.email.strip()))
+    with c3:
+        ss.telefono = st.text_input("Teléfono*", value=ss.telefono, placeholder="Ej: 11 5555 5555")
+        error_inline(v.campo("telefono", ss.telefono), mostrar=False)
+    st.markdown('</div>', unsafe_allow_html=True)
 
-if st.session_state.pais_origen == "Otro":
-    st.text_input(
-        "Ingresá el país de origen",
-        key="pais_origen_otro",
-        placeholder="Ej: Vietnam"
+# -------------------- País de origen --------------------
+@st.fragment
+@REGISTRY.timed("gt_section_seconds", section="pais")
+def seccion_pais():
+    st.markdown('<div class="gt-section">', unsafe_allow_html=True)
+    st.subheader("País de origen de los productos a cotizar")
+
+    # Evitamos resets: controlamos sólo por 'key' y usamos el valor al final
+    st.radio(
+        "Seleccioná el país de origen:",
+        ["China", "Otro"],
+        key="pais_origen",
+        horizontal=True
     )
-st.markdown('</div>', unsafe_allow_html=True)
 
-st.markdown('<div class="gt-section"><div class="gt-divider"></div></div>', unsafe_allow_html=True)
+    if st.session_state.pais_origen == "Otro":
+        st.text_input(
+            "Ingresá el país de origen",
+            key="pais_origen_otro",
+            placeholder="Ej: Vietnam"
+        )
+        error_inline(st.session_state.validacion.campo("pais", (st.session_state.pais_origen, st.session_state.pais_origen_otro)), mostrar=False)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    # El precio estimado (sección de bultos) lee el país directamente. Sólo si cambia la tabla que le aplica
+    # (p.ej. de China a la general) se re-ejecuta la página; tipear el nombre del país no sale del fragmento.
+    tarifas = get_tarifas()
+    if tarifas is not None:
+        origen = tarifas.origen(pais_final(st.session_state))
+        if origen != st.session_state.setdefault("tarifa_origen", origen):
+            st.session_state.tarifa_origen = origen
+            st.rerun()
 
 # -------------------- Productos --------------------
-st.markdown('<div class="gt-section">', unsafe_allow_html=True)
-st.subheader("Productos")
-st.caption("Cargá descripción y link del/los producto(s). Podés agregar varios.")
-
-for i, p in enumerate(st.session_state.productos):
-    st.markdown(f"**Producto {i+1}**")
-    pc1, pc2 = st.columns(2)
-    with pc1:
-        st.session_state.productos[i]["descripcion"] = st.text_area(
-            "Descripción*", value=p["descripcion"], key=f"prod_desc_{i}",
-            placeholder='Ej: "Máquina selladora de bolsas"', height=80
+@st.fragment
+@REGISTRY.timed("gt_section_seconds", section="productos")
+def seccion_productos():
+    st.markdown('<div class="gt-section">', unsafe_allow_html=True)
+    st.subheader("Productos")
+    st.caption("Cargá descripción y link del/los producto(s). Podés agregar varios.")
+
+    aviso_limite()
+    st.toggle("Edición en tabla", key="productos_tabla", on_change=on_modo_tabla,
+              args=("productos", PRODUCTO_KEYS), help="Más cómodo para listas largas.")
+    productos = st.session_state.productos
+    if st.session_state.productos_tabla:
+        df = editor_tabla("productos", {
+            "descripcion": st.column_config.TextColumn("Descripción*"),
+            "link": st.column_config.TextColumn("Link*"),
+        }, vacio="")
+        if df is not None and hay_lugar((len(df) - len(productos)) * PRODUCTO_ROW_BYTES):
+            productos.replace(df.to_dict("records"))
+            if not len(productos): productos.append()
+            st.session_state.validacion.cargar_productos(productos)
+    else:
+        for i in paginar(len(productos), "productos_page"):
+            rid = productos.id(i)
+            desc_key, link_key = f"prod_desc_{rid}", f"prod_link_{rid}"
+            p = productos.row(i)
+            if desc_key not in st.session_state: st.session_state[desc_key] = p["descripcion"]
+            if link_key not in st.session_state: st.session_state[link_key] = p["link"]
+
+            st.markdown(f"**Producto {i+1}**")
+            pc1, pc2 = st.columns(2)
+            with pc1:
+                st.text_area(
+                    "Descripción*", key=desc_key, on_change=on_producto_change, args=(rid,),
+                    placeholder='Ej: "Máquina selladora de bolsas"', height=80
+                )
+            with pc2:
+                st.text_area(
+                    "Link*", key=link_key, on_change=on_producto_change, args=(rid,),
+                    placeholder="https://...", height=80
+                )
+            col_del, _ = st.columns([1,3])
+            with col_del:
+                st.button("🗑️ Eliminar producto", key=f"del_prod_{rid}", on_click=del_producto, args=(rid,), use_container_width=True)
+            if not producto_valido(p) and (p["descripcion"].strip() or p["link"].strip()):
+                error_inline("Completá descripción y link; si falta alguno, este producto no se envía.")
+            st.markdown('<div class="gt-item-divider"></div>', unsafe_allow_html=True)
+
+        error_inline(error_productos(st.session_state.validacion.productos_validos > 0), mostrar=False)
+        st.markdown('<div class="gt-actions-row">', unsafe_allow_html=True)
+        pA, pB = st.columns(2)
+        with pA: st.button("➕ Agregar producto", on_click=add_producto, use_container_width=True)
+        with pB: st.button("🧹 Vaciar productos", on_click=clear_productos, use_container_width=True)
+        st.markdown('</div>', unsafe_allow_html=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+# -------------------- Bultos + Pesos --------------------
+@st.fragment
+@REGISTRY.timed("gt_section_seconds", section="carga")
+def seccion_carga():
+    st.markdown('<div class="gt-section">', unsafe_allow_html=True)
+    st.subheader("Bultos")
+    st.caption("Cargá por bulto: **cantidad** y **dimensiones en cm**. Calculamos el **peso volumétrico**.")
+
+    aviso_limite()
+    with st.expander("📄 Importar lista de empaque (CSV o Excel)"):
+        st.caption("Columnas: cantidad, ancho, alto y largo (en cm). Se aceptan decimales con coma.")
+        st.file_uploader("Archivo", type=["csv", "xlsx"], key="bultos_archivo", label_visibility="collapsed")
+        st.button("Importar bultos", on_click=importar_bultos, disabled=st.session_state.get("bultos_archivo") is None,
+                  help="Reemplaza los bultos cargados.")
+    aviso_importacion()
+    st.toggle("Edición en tabla", key="bultos_tabla", on_change=on_modo_tabla,
+              args=("bultos", BULTO_KEYS), help="Más cómodo para listas largas.")
+    bultos = st.session_state.bultos
+    if st.session_state.bultos_tabla:
+        df = editor_tabla("bultos", {
+            "cant": st.column_config.NumberColumn("Cantidad", min_value=0, max_value=MAX_CANT, step=1, default=0),
+            "ancho": st.column_config.NumberColumn("Ancho (cm)", min_value=0.0, max_value=MAX_MEDIDA_CM, default=0.0),
+            "alto": st.column_config.NumberColumn("Alto (cm)", min_value=0.0, max_value=MAX_MEDIDA_CM, default=0.0),
+            "largo": st.column_config.NumberColumn("Largo (cm)", min_value=0.0, max_value=MAX_MEDIDA_CM, default=0.0),
+        }, vacio=0)
+        if df is not None and hay_lugar((len(df) - len(bultos)) * BULTO_ROW_BYTES):
+            try:
+                bultos.replace({k: df[k].to_numpy() for k in BultosStore.COLS})
+            except ValueError as e:
+                st.warning(f"No se guardaron los cambios de la tabla: {e}")
+            if not len(bultos): bultos.append()
+            st.session_state.pesos_inc = PesosIncrementales(bultos.bultos())
+            st.session_state.validacion.cargar_bultos(bultos)
+    else:
+        for i in paginar(len(bultos), "bultos_page"):
+            rid = bultos.id(i)
+            r = bultos.row(i)
+            # FIX anti “salto atrás”: sembrar default sólo una vez y NO pasar value= en el widget
+            cant_key = f"cant_{rid}"
+            an_key   = f"an_{rid}"
+            al_key   = f"al_{rid}"
+            lar_key  = f"lar_{rid}"
+            if cant_key not in st.session_state: st.session_state[cant_key] = r["cant"]
+            if an_key   not in st.session_state: st.session_state[an_key]   = r["ancho"]
+            if al_key   not in st.session_state: st.session_state[al_key]   = r["alto"]
+            if lar_key  not in st.session_state: st.session_state[lar_key]  = r["largo"]
+
+            st.markdown(f"**Bulto {i+1}**")
+            c1, c2, c3, c4 = st.columns([0.9, 1, 1, 1])
+            # on_change escribe en el modelo y actualiza los totales sin recorrer la lista
+            with c1: st.number_input("Cantidad",  min_value=0,   max_value=MAX_CANT,      step=1,   key=cant_key, on_change=on_bulto_change, args=(rid,))
+            with c2: st.number_input("Ancho (cm)", min_value=0.0, max_value=MAX_MEDIDA_CM, step=1.0, key=an_key, on_change=on_bulto_change, args=(rid,))
+            with c3: st.number_input("Alto (cm)",  min_value=0.0, max_value=MAX_MEDIDA_CM, step=1.0, key=al_key, on_change=on_bulto_change, args=(rid,))
+            with c4: st.number_input("Largo (cm)", min_value=0.0, max_value=MAX_MEDIDA_CM, step=1.0, key=lar_key, on_change=on_bulto_change, args=(rid,))
+
+            col_del, _ = st.columns([1,3])
+            with col_del:
+                st.button("🗑️ Eliminar bulto", key=f"del_row_{rid}", on_click=del_row, args=(rid,), use_container_width=True)
+            valida, con_piezas = estado_bulto(r)
+            if con_piezas and not valida:
+                error_inline("Faltan las medidas del bulto.")
+            elif not con_piezas and r["ancho"] + r["alto"] + r["largo"] > 0:
+                error_inline("Falta la cantidad de piezas.")
+            st.markdown('<div class="gt-item-divider"></div>', unsafe_allow_html=True)
+
+        error_inline(error_bultos(st.session_state.validacion.bultos_validos > 0), mostrar=False)
+        st.markdown('<div class="gt-actions-row">', unsafe_allow_html=True)
+        ba, bb = st.columns(2)
+        with ba: st.button("➕ Agregar bulto", on_click=add_row, use_container_width=True)
+        with bb: st.button("🧹 Vaciar bultos", on_click=clear_rows, use_container_width=True)
+        st.markdown('</div>', unsafe_allow_html=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    st.markdown('<div class="gt-section"><div class="gt-divider"></div></div>', unsafe_allow_html=True)
+
+    st.markdown('<div class="gt-section">', unsafe_allow_html=True)
+    st.subheader("Peso total de los bultos")
+    m1, m2 = st.columns([1.2, 1.0])
+    with m1:
+        st.session_state.peso_bruto_raw = st.text_input(
+            "Peso bruto total (kg)", value=st.session_state.peso_bruto_raw,
+            help="Usá punto o coma para decimales (ej: 1.25)"
         )
-    with pc2:
-        st.session_state.productos[i]["link"] = st.text_area(
-            "Link*", value=p["link"], key=f"prod_link_{i}",
-            placeholder="https://...", height=80
+        st.session_state.peso_bruto = to_float(st.session_state.peso_bruto_raw, 0.0)
+    total_peso_vol, peso_aplicable, excede = st.session_state.pesos_inc.resumen(st.session_state.peso_bruto)
+    with m2:
+        st.markdown(f"<div class='gt-pill'><span>Peso aplicable (kg) 🔒</span> <b>{peso_aplicable:,.2f}</b></div>", unsafe_allow_html=True)
+        st.caption(f"Se toma el mayor entre peso volumétrico ({total_peso_vol:,.2f}) y peso bruto ({st.session_state.peso_bruto:,.2f}).")
+        tarifas = get_tarifas()
+        est = tarifas.estimate(pais_final(st.session_state), peso_aplicable) if tarifas else None
+        if est:
+            st.markdown(f"<div class='gt-pill'><span>Precio estimado ({est.moneda})</span> <b>{est.total:,.2f}</b></div>", unsafe_allow_html=True)
+            st.caption(f"Tarifa {est.origen} hasta {est.tramo_hasta_kg:g} kg, recargos incluidos. La cotización final llega por mail.")
+        elif tarifas and peso_aplicable > 0:
+            st.caption("Sin precio estimado para este peso u origen: te lo cotizamos por mail.")
+    if excede:
+        st.warning(f"El peso bruto promedio por pieza supera los {MAX_PESO_BULTO_KG:g} kg por bulto permitidos por el courier. "
+                   "Podés enviar la solicitud igual: lo revisamos al cotizar.")
+    couriers = get_couriers()
+    if couriers and st.toggle("Comparar couriers", key="comparar_couriers", help="Peso aplicable según el divisor y el redondeo de cada courier."):
+        st.dataframe(
+            PROFILE.lazy_import("pandas").DataFrame(compare_carriers(bultos.bultos(), st.session_state.peso_bruto, couriers)),
+            hide_index=True, use_container_width=True,
+            column_config={
+                "ranking": st.column_config.NumberColumn("#"),
+                "courier": "Courier",
+                "divisor": st.column_config.NumberColumn("Divisor", format="%d"),
+                "volumetrico_kg": st.column_config.NumberColumn("Volumétrico (kg)", format="%.2f"),
+                "aplicable_kg": st.column_config.NumberColumn("Aplicable (kg)", format="%.2f"),
+            },
+            column_order=("ranking", "courier", "divisor", "volumetrico_kg", "aplicable_kg"),
         )
-    col_del, _ = st.columns([1,3])
-    with col_del:
-        if st.button("🗑️ Eliminar producto", key=f"del_prod_{i}", use_container_width=True):
-            if len(st.session_state.productos) > 1:
-                st.session_state.productos.pop(i)
-            else:
-                st.session_state.productos = [{"descripcion":"", "link":""}]
-            st.rerun()
-    st.markdown('<div class="gt-item-divider"></div>', unsafe_allow_html=True)
-
-st.markdown('<div class="gt-actions-row">', unsafe_allow_html=True)
-pA, pB = st.columns(2)
-with pA: st.button("➕ Agregar producto", on_click=add_producto, use_container_width=True)
-with pB: st.button("🧹 Vaciar productos", on_click=clear_productos, use_container_width=True)
-st.markdown('</div>', unsafe_allow_html=True)
-st.markdown('</div>', unsafe_allow_html=True)
-
-st.markdown('<div class="gt-section"><div class="gt-divider"></div></div>', unsafe_allow_html=True)
-
-# -------------------- Bultos --------------------
-st.markdown('<div class="gt-section">', unsafe_allow_html=True)
-st.subheader("Bultos")
-st.caption("Cargá por bulto: **cantidad** y **dimensiones en cm**. Calculamos el **peso volumétrico**.")
-
-for i, r in enumerate(st.session_state.rows):
-    # FIX anti “salto atrás”: sembrar default sólo una vez y NO pasar value= en el widget
-    cant_key = f"cant_{i}"
-    an_key   = f"an_{i}"
-    al_key   = f"al_{i}"
-    lar_key  = f"lar_{i}"
-    if cant_key not in st.session_state: st.session_state[cant_key] = int(r["cant"])
-    if an_key   not in st.session_state: st.session_state[an_key]   = float(r["ancho"])
-    if al_key   not in st.session_state: st.session_state[al_key]   = float(r["alto"])
-    if lar_key  not in st.session_state: st.session_state[lar_key]  = float(r["largo"])
-
-    st.markdown(f"**Bulto {i+1}**")
-    c1, c2, c3, c4 = st.columns([0.9, 1, 1, 1])
-    with c1:
-        st.number_input("Cantidad",  min_value=0,   step=1,   key=cant_key)
-        st.session_state.rows[i]["cant"]  = int(st.session_state[cant_key])
-    with c2:
-        st.number_input("Ancho (cm)", min_value=0.0, step=1.0, key=an_key)
-        st.session_state.rows[i]["ancho"] = float(st.session_state[an_key])
-    with c3:
-        st.number_input("Alto (cm)",  min_value=0.0, step=1.0, key=al_key)
-        st.session_state.rows[i]["alto"]  = float(st.session_state[al_key])
-    with c4:
-        st.number_input("Largo (cm)", min_value=0.0, step=1.0, key=lar_key)
-        st.session_state.rows[i]["largo"] = float(st.session_state[lar_key])
-
-    col_del, _ = st.columns([1,3])
-    with col_del:
-        if st.button("🗑️ Eliminar bulto", key=f"del_row_{i}", use_container_width=True):
-            if len(st.session_state.rows) > 1:
-                st.session_state.rows.pop(i)
-            else:
-                st.session_state.rows = [{"cant":0, "ancho":0, "alto":0, "largo":0}]
-            for k in [cant_key, an_key, al_key, lar_key]:
-                if k in st.session_state: del st.session_state[k]
-            st.rerun()
-    st.markdown('<div class="gt-item-divider"></div>', unsafe_allow_html=True)
-
-st.markdown('<div class="gt-actions-row">', unsafe_allow_html=True)
-ba, bb = st.columns(2)
-with ba: st.button("➕ Agregar bulto", on_click=add_row, use_container_width=True)
-with bb: st.button("🧹 Vaciar bultos", on_click=clear_rows, use_container_width=True)
-st.markdown('</div>', unsafe_allow_html=True)
-st.markdown('</div>', unsafe_allow_html=True)
-
-st.markdown('<div class="gt-section"><div class="gt-divider"></div></div>', unsafe_allow_html=True)
-
-# -------------------- Pesos --------------------
-st.markdown('<div class="gt-section">', unsafe_allow_html=True)
-st.subheader("Peso total de los bultos")
-m1, m2 = st.columns([1.2, 1.0])
-with m1:
-    st.session_state.peso_bruto_raw = st.text_input(
-        "Peso bruto total (kg)", value=st.session_state.peso_bruto_raw,
-        help="Usá punto o coma para decimales (ej: 1.25)"
-    )
-    st.session_state.peso_bruto = to_float(st.session_state.peso_bruto_raw, 0.0)
-total_peso_vol = compute_total_vol(st.session_state.rows)
-peso_aplicable = max(total_peso_vol, st.session_state.peso_bruto)
-with m2:
-    st.markdown(f"<div class='gt-pill'><span>Peso aplicable (kg) 🔒</span> <b>{peso_aplicable:,.2f}</b></div>", unsafe_allow_html=True)
-    st.caption(f"Se toma el mayor entre peso volumétrico ({total_peso_vol:,.2f}) y peso bruto ({st.session_state.peso_bruto:,.2f}).")
-st.markdown('</div>', unsafe_allow_html=True)
-
-st.markdown('<div class="gt-section"><div class="gt-divider"></div></div>', unsafe_allow_html=True)
+    st.markdown('</div>', unsafe_allow_html=True)
 
 # -------------------- Valor total --------------------
-st.markdown('<div class="gt-section">', unsafe_allow_html=True)
-st.subheader("Valor total del pedido")
-st.session_state.valor_mercaderia_raw = st.text_input("Valor total (USD)", value=st.session_state.valor_mercaderia_raw, placeholder="Ej: 2500.00")
-st.session_state.valor_mercaderia = to_float(st.session_state.valor_mercaderia_raw, 0.0)
-st.markdown('</div>', unsafe_allow_html=True)
-
-st.markdown('<div class="gt-section"><div class="gt-divider"></div></div>', unsafe_allow_html=True)
+@st.fragment
+@REGISTRY.timed("gt_section_seconds", section="valor")
+def seccion_valor():
+    st.markdown('<div class="gt-section">', unsafe_allow_html=True)
+    st.subheader("Valor total del pedido")
+    st.session_state.valor_mercaderia_raw = st.text_input("Valor total (USD)", value=st.session_state.valor_mercaderia_raw, placeholder="Ej: 2500.00")
+    st.session_state.valor_mercaderia = to_float(st.session_state.valor_mercaderia_raw, 0.0)
+    if st.session_state.valor_mercaderia > MAX_VALOR_USD:
+        st.warning(f"El valor total supera los {MAX_VALOR_USD:,.0f} USD permitidos por el courier. "
+                   "Podés enviar la solicitud igual: lo revisamos al cotizar.")
+    st.markdown('</div>', unsafe_allow_html=True)
 
 # -------------------- Submit --------------------
-st.markdown('<div id="gt-submit-btn" class="gt-section">', unsafe_allow_html=True)
-submit_clicked = st.button("📨 Solicitar cotización", use_container_width=True, key="gt_submit_btn")
-st.markdown('</div>', unsafe_allow_html=True)
-
-if submit_clicked:
-    st.session_state.form_errors = validate()
-    if not st.session_state.form_errors:
-        productos_validos = [
-            {"descripcion": p["descripcion"].strip(), "link": p["link"].strip()}
-            for p in st.session_state.productos if p["descripcion"].strip() and p["link"].strip()
-        ]
-        # Normalizamos país de origen aquí para evitar resets durante la edición
-        pais_final = "China" if st.session_state.pais_origen == "China" else (st.session_state.pais_origen_otro or "").strip()
-        payload = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "origen": "streamlit-cotizador",
-            "factor_vol": FACTOR_VOL,
-            "contacto": {
-                "nombre": st.session_state.nombre.strip(),
-                "email": st.session_state.email.strip(),
-                "telefono": st.session_state.telefono.strip()
-            },
-            "pais_origen": pais_final,
-            "productos": productos_validos,
-            "bultos": st.session_state.rows,
-            "pesos": {
-                "volumetrico_kg": total_peso_vol,
-                "bruto_kg": st.session_state.peso_bruto,
-                "aplicable_kg": peso_aplicable
-            },
-            "valor_mercaderia_usd": st.session_state.valor_mercaderia
-        }
-        try:
-            post_to_webhook(payload)
-        except Exception:
-            pass
-        st.session_state.show_dialog = True
-
-# -------------------- Errores --------------------
-if st.session_state.form_errors:
-    st.error("Revisá estos puntos:\n\n" + "\n".join(st.session_state.form_errors))
-
-# -------------------- Popup --------------------
-if st.session_state.get("show_dialog", False):
-    email = (st.session_state.email or "").strip()
-    email_html = f"<a href='mailto:{email}'>{email}</a>" if email else "tu correo"
-    st.markdown(f"""
+@st.fragment
+@REGISTRY.timed("gt_section_seconds", section="submit")
+def seccion_submit():
+    st.markdown('<div id="gt-submit-btn" class="gt-section">', unsafe_allow_html=True)
+    submit_clicked = st.button("📨 Solicitar cotización", use_container_width=True, key="gt_submit_btn")
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    if submit_clicked and not admitted("submit"):
+        st.warning("Recibimos varias solicitudes seguidas. Esperá un minuto antes de enviar otra.")
+    elif submit_clicked:
+        # Los errores salen del estado incremental (ya al día con cada edición): un envío rechazado no recorre el form
+        ss = st.session_state
+        ss.form_errors = [e.texto for e in ss.validacion.errores(ss)]
+        if ss.form_errors and not ss.intento_envio:
+            # primer intento: se re-ejecuta la página para marcar cada campo pendiente en su sección
+            ss.intento_envio = True
+            st.rerun()
+        if not ss.form_errors:
+            # Cálculo completo (no incremental) sobre el estado final del formulario
+            pesos = compute_pesos(ss.bultos.bultos(), ss.peso_bruto, ss.valor_mercaderia)
+            form = current_form()
+            # El país de origen se normaliza recién acá para evitar resets durante la edición
+            tarifas = get_tarifas()
+            est = tarifas.estimate(pais_final(form), pesos.aplicable) if tarifas else None
+            couriers = compare_carriers(st.session_state.bultos.bultos(), st.session_state.peso_bruto, get_couriers())
+            payload = build_payload(form, pesos, estimacion=est.to_dict() if est else None, couriers=couriers)
+            try:
+                post_to_webhook(payload)
+                st.session_state.show_dialog = True
+            except Exception:
+                # no quedó guardada en ningún lado: el usuario tiene que saberlo para reintentar
+                log.exception("no se pudo guardar la solicitud")
+                st.error("No pudimos guardar tu solicitud. Probá de nuevo en unos minutos.")
+
+    # -------------------- Errores --------------------
+    if st.session_state.form_errors:
+        st.error("Revisá estos puntos:\n\n" + "\n".join(st.session_state.form_errors))
+
+    # -------------------- Popup --------------------
+    if st.session_state.get("show_dialog", False):
+        email = (st.session_state.email or "").strip()
+        email_html = f"<a href='mailto:{email}'>{email}</a>" if email else "tu correo"
+        st.markdown(f"""
 <div class="gt-overlay">
   <div class="gt-modal">
     <a class="gt-close" href="?gt=close" target="_self">✕</a>
@@ -456,3 +839,13 @@ if st.session_state.get("show_dialog", False):
   </div>
 </div>
 """, unsafe_allow_html=True)
+
+# -------------------- Página --------------------
+for seccion in (seccion_contacto, seccion_pais, seccion_productos, seccion_carga, seccion_valor):
+    seccion()
+    st.markdown(DIVIDER, unsafe_allow_html=True)
+seccion_submit()
+
+SESSIONS.touch(session_id())
+REGISTRY.observe("gt_section_seconds", time.perf_counter() - _t_rerun, section="pagina")
+PROFILE.first_render(time.perf_counter() - _t_rerun)
@@ -0,0 +1,127 @@
+# batch.py
+# Re-cotización masiva sin Streamlit:
+#   python batch.py solicitudes.jsonl -o cotizaciones.jsonl
+#   python batch.py solicitudes.csv -o cotizaciones.jsonl --workers 8
+#   python batch.py solicitudes.jsonl -o cotizaciones.jsonl --couriers couriers.json  (ranking de couriers en el payload)
+# Cada línea de salida es {"linea", "ok", "errores", "detalle", "avisos", "payload"}, en el mismo orden que la entrada
+# (`detalle`: los errores como objetos {"campo", "codigo", "mensaje", "filas"}, ver quoting.ErrorValidacion;
+# `avisos`: topes del courier superados, con la misma forma y `filas` vacío (son de la solicitud entera). No invalidan el registro).
+from __future__ import annotations
+import argparse, csv, json, os, sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from quoting import Carrier, ErrorValidacion, load_carriers, quote
+
+BULTO_KEYS = ("cant", "ancho", "alto", "largo")
+
+
+def normalize(rec: dict) -> dict:
+    """Acepta tanto un form plano como un payload ya enviado al webhook (contacto/pesos anidados)."""
+    f = dict(rec)
+    contacto = f.pop("contacto", None) or {}
+    for k in ("nombre", "email", "telefono"):
+        f.setdefault(k, contacto.get(k, ""))
+    pesos = f.pop("pesos", None) or {}
+    f.setdefault("peso_bruto", pesos.get("bruto_kg", 0.0))
+    f.setdefault("valor_mercaderia", f.pop("valor_mercaderia_usd", 0.0))
+    if "pais_origen" in f and f["pais_origen"] not in ("China", "Otro"):
+        # en el payload el país "Otro" ya viene resuelto
+        f["pais_origen"], f["pais_origen_otro"] = "Otro", f["pais_origen"]
+    return f
+
+
+def _from_csv_row(row: dict) -> dict:
+    # productos/bultos pueden venir como JSON en una columna, o como un único producto/bulto en columnas sueltas
+    f = {k: v for k, v in row.items() if k not in BULTO_KEYS + ("descripcion", "link")}
+    f["productos"] = json.loads(row["productos"]) if row.get("productos") else \
+        [{"descripcion": row.get("descripcion", ""), "link": row.get("link", "")}]
+    f["bultos"] = json.loads(row["bultos"]) if row.get("bultos") else \
+        [{k: row.get(k, 0) for k in BULTO_KEYS}]
+    return f
+
+
+def read_records(path: str, fmt: str):
+    """Genera (linea, registro | None, error) de a uno: la entrada nunca se carga entera en memoria."""
+    fh = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    with fh:
+        if fmt == "csv":
+            for n, row in enumerate(csv.DictReader(fh), start=2):
+                try:
+                    yield n, _from_csv_row(row), None
+                except ValueError as e:
+                    yield n, None, f"CSV inválido: {e}"
+        else:
+            for n, line in enumerate(fh, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield n, json.loads(line), None
+                except ValueError as e:
+                    yield n, None, f"JSON inválido: {e}"
+
+
+def quote_chunk(chunk: list[tuple[int, dict | None, str | None]], carriers: tuple[Carrier, ...] = ()) -> list[dict]:
+    out = []
+    for n, rec, err in chunk:
+        if rec is None:
+            e = ErrorValidacion("registro", "invalido", err)
+            out.append({"linea": n, "ok": False, "errores": [err], "detalle": [e.to_dict()], "avisos": [], "payload": None})
+            continue
+        try:
+            res = quote(normalize(rec), timestamp=rec.get("timestamp"), carriers=carriers)
+        except Exception as e:  # un registro roto no frena el lote
+            err = ErrorValidacion("registro", "error", f"Error procesando el registro: {e}")
+            res = {"ok": False, "errores": [err.mensaje], "detalle": [err.to_dict()], "avisos": [], "payload": None}
+        out.append({"linea": n, **res})
+    return out
+
+
+def run(path: str, out, fmt: str, workers: int, chunk_size: int, max_inflight: int,
+        carriers: tuple[Carrier, ...] = ()) -> tuple[int, int]:
+    records = read_records(path, fmt)
+    chunks = iter(lambda: list(islice(records, chunk_size)), [])
+    total = ok = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Ventana acotada de chunks en vuelo: memoria constante y salida en orden de entrada
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(quote_chunk, chunk, carriers))
+            if len(pending) >= max_inflight:
+                total, ok = _drain(pending.popleft(), out, total, ok)
+        while pending:
+            total, ok = _drain(pending.popleft(), out, total, ok)
+    return total, ok
+
+
+def _drain(fut, out, total, ok):
+    for res in fut.result():
+        out.write(json.dumps(res, ensure_ascii=False) + "\n")
+        total += 1
+        ok += res["ok"]
+    return total, ok
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Cotiza en lote solicitudes JSONL/CSV.")
+    ap.add_argument("input", help="archivo .jsonl/.csv ('-' para stdin)")
+    ap.add_argument("-o", "--output", default="-", help="archivo JSONL de salida (default: stdout)")
+    ap.add_argument("--format", choices=["jsonl", "csv"], help="default: según la extensión")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--chunk-size", type=int, default=500)
+    ap.add_argument("--max-inflight", type=int, default=0, help="chunks en vuelo (default: 2 x workers)")
+    ap.add_argument("--couriers", help="tabla de couriers JSON para el ranking del payload (default: GT_COURIERS_PATH; sin tabla no se compara)")
+    args = ap.parse_args(argv)
+    path = args.couriers or os.environ.get("GT_COURIERS_PATH")
+    carriers = load_carriers(path) if path else ()
+
+    fmt = args.format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    with out:
+        total, ok = run(args.input, out, fmt, args.workers, args.chunk_size, args.max_inflight or 2 * args.workers, carriers)
+    print(f"{total} solicitudes procesadas, {ok} válidas, {total - ok} con errores.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
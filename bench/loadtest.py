@@ -0,0 +1,262 @@
+# bench/loadtest.py
+# Prueba de carga: levanta app.py con `streamlit run`, un webhook de mentira en lugar de N8N_WEBHOOK_URL
+# y N usuarios concurrentes que completan y envían el formulario por el websocket de Streamlit
+# (el mismo protocolo que usa el navegador).
+#
+#   python bench/loadtest.py --users 20 --sessions 3
+#   python bench/loadtest.py --users 50 --webhook-latency 0.8 --webhook-error-rate 0.1 -o carga.json
+#   python bench/loadtest.py --users 20 --full-reruns        # cada interacción re-ejecuta la página entera
+#
+# Reporta throughput (reruns y envíos por segundo), latencias p50/p95/p99 de reruns y de envíos,
+# y cuántas solicitudes aceptadas llegaron al webhook (con reintentos y outbox incluidos).
+# Requiere el paquete `websockets` (viene con el servidor de Streamlit).
+from __future__ import annotations
+import argparse, asyncio, json, os, random, socket, statistics, subprocess, sys, tempfile, threading, time, urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+sys.path.insert(0, ROOT)
+
+from dedupe import idempotency_key
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"n": 0}
+    qs = statistics.quantiles(values, n=100, method="inclusive") if len(values) > 1 else [values[0]] * 99
+    return {"n": len(values), "p50_ms": round(qs[49] * 1000, 1), "p95_ms": round(qs[94] * 1000, 1),
+            "p99_ms": round(qs[98] * 1000, 1), "max_ms": round(max(values) * 1000, 1)}
+
+
+# -------------------- Webhook de mentira --------------------
+class FakeWebhook:
+    """Responde con `latency` segundos de demora (± jitter) y un 500 con probabilidad `error_rate`."""
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, error_rate: float = 0.0):
+        self.latency, self.jitter, self.error_rate = latency, jitter, error_rate
+        self.requests = 0
+        self.errors = 0
+        self.delivered: dict[str, float] = {}  # idempotency key -> primera entrega OK
+        self._lock = threading.Lock()
+        hook = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                time.sleep(max(0.0, hook.latency + random.uniform(-hook.jitter, hook.jitter)))
+                fail = random.random() < hook.error_rate
+                with hook._lock:
+                    hook.requests += 1
+                    if fail:
+                        hook.errors += 1
+                    else:
+                        data = json.loads(body or b"null")
+                        for item in data if isinstance(data, list) else [data]:
+                            hook.delivered.setdefault(idempotency_key(item), time.monotonic())
+                self.send_response(500 if fail else 200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/hook"
+
+    def close(self):
+        self.server.shutdown()
+
+
+# -------------------- Servidor de la app --------------------
+def start_app(port: int, webhook_url: str, tmp: str, extra_env: dict) -> subprocess.Popen:
+    # Los usuarios entran por loopback con su propio X-Forwarded-For: el harness hace de proxy de confianza
+    env = {**os.environ, "N8N_WEBHOOK_URL": webhook_url, "GT_OUTBOX_PATH": os.path.join(tmp, "outbox.sqlite3"),
+           "GT_TRUSTED_PROXIES": "127.0.0.1,::1", **extra_env}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP, "--server.headless", "true", "--server.port", str(port),
+         "--browser.gatherUsageStats", "false", "--server.fileWatcherType", "none"],
+        cwd=tmp, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("streamlit terminó al arrancar:\n" + proc.stderr.read().decode(errors="replace"))
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as r:
+                if r.status == 200:
+                    return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("streamlit no respondió /_stcore/health en 60 s")
+
+
+# -------------------- Usuario simulado --------------------
+class Session:
+    """Una pestaña del navegador: manda BackMsg de rerun con el estado de los widgets y espera el fin del script."""
+
+    def __init__(self, ws, full_reruns: bool):
+        self.ws = ws
+        self.full_reruns = full_reruns
+        self.widgets: dict[str, tuple[str, str, str]] = {}  # label o key -> (id, tipo, fragment_id)
+        self.values: dict[str, tuple[str, object]] = {}      # id -> (campo del proto, valor)
+        self.texts: list[str] = []
+
+    def _collect(self, fmsg):
+        el = fmsg.delta.new_element
+        kind = el.WhichOneof("type")
+        w = getattr(el, kind) if kind else None
+        if kind in ("markdown", "alert"):
+            self.texts.append(w.body)
+        elif w is not None and getattr(w, "id", ""):
+            user_key = w.id.rsplit("-", 1)[-1]
+            name = user_key if user_key != "None" else w.label
+            self.widgets[name] = (w.id, kind, fmsg.delta.fragment_id)
+
+    async def rerun(self, fragment_id: str = "", trigger: str | None = None) -> float:
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        cs = msg.rerun_script
+        cs.query_string = ""
+        if fragment_id and not self.full_reruns:
+            cs.fragment_id = fragment_id
+        for wid, (field, value) in self.values.items():
+            ws = cs.widget_states.widgets.add()
+            ws.id = wid
+            setattr(ws, field, value)
+        if trigger:
+            ws = cs.widget_states.widgets.add()
+            ws.id = trigger
+            ws.trigger_value = True
+        self.texts = []
+        t0 = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        while True:
+            fmsg = ForwardMsg()
+            fmsg.ParseFromString(await self.ws.recv())
+            kind = fmsg.WhichOneof("type")
+            if kind == "delta" and fmsg.delta.WhichOneof("type") == "new_element":
+                self._collect(fmsg)
+            elif kind == "script_finished":
+                return time.perf_counter() - t0
+
+    async def set(self, name: str, value) -> float:
+        wid, kind, fragment_id = self.widgets[name]
+        field = "string_value" if isinstance(value, str) else "int_value" if isinstance(value, int) else "double_value"
+        self.values[wid] = (field, value)
+        return await self.rerun(fragment_id)
+
+    async def click(self, name: str) -> float:
+        wid, _, fragment_id = self.widgets[name]
+        return await self.rerun(fragment_id, trigger=wid)
+
+
+async def user(n: int, args, port: int, stats: dict):
+    import websockets
+
+    for s in range(args.sessions):
+        await asyncio.sleep(random.uniform(0, args.ramp))
+        # IP propia por usuario (el limitador es por cliente); la app la toma porque loopback es proxy de confianza
+        headers = {"X-Forwarded-For": f"10.{n // 250}.{n % 250}.{s + 1}"}
+        try:
+            async with websockets.connect(f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=["streamlit"],
+                                          additional_headers=headers, max_size=None, open_timeout=30) as ws:
+                sess = Session(ws, args.full_reruns)
+                stats["rerun"].append(await sess.rerun())
+                steps = [
+                    ("Nombre completo*", f"Usuario {n}"),
+                    ("Correo electrónico*", f"user{n}.{s}@example.com"),
+                    ("Teléfono*", f"11 5555 {n:04d}"),
+                    ("prod_desc_0", f"Producto {n}-{s}"),
+                    ("prod_link_0", f"https://example.com/p/{n}/{s}"),
+                    ("cant_0", 1 + n % 3),
+                    ("an_0", 30.0), ("al_0", 20.0), ("lar_0", 40.0),
+                    ("Peso bruto total (kg)", f"{5 + n % 10}.5"),
+                    ("Valor total (USD)", f"{100 + n}.00"),
+                ]
+                for name, value in steps:
+                    await asyncio.sleep(random.uniform(0, args.think))
+                    stats["rerun"].append(await sess.set(name, value))
+                await asyncio.sleep(random.uniform(0, args.think))
+                stats["submit"].append(await sess.click("gt_submit_btn"))
+                body = "\n".join(sess.texts)
+                stats["accepted" if "¡Listo!" in body else "rejected"] += 1
+        except Exception as e:
+            stats["errors"].append(f"usuario {n}: {type(e).__name__}: {e}")
+
+
+async def run_users(args, port: int) -> dict:
+    stats = {"rerun": [], "submit": [], "accepted": 0, "rejected": 0, "errors": []}
+    await asyncio.gather(*(user(n, args, port, stats) for n in range(args.users)))
+    return stats
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Prueba de carga de app.py con usuarios concurrentes.")
+    ap.add_argument("--users", type=int, default=10, help="usuarios concurrentes")
+    ap.add_argument("--sessions", type=int, default=1, help="formularios enviados por usuario")
+    ap.add_argument("--think", type=float, default=0.2, help="pausa máxima entre interacciones (s)")
+    ap.add_argument("--ramp", type=float, default=2.0, help="demora máxima antes de abrir cada sesión (s)")
+    ap.add_argument("--webhook-latency", type=float, default=0.05)
+    ap.add_argument("--webhook-jitter", type=float, default=0.0)
+    ap.add_argument("--webhook-error-rate", type=float, default=0.0)
+    ap.add_argument("--full-reruns", action="store_true", help="no usar reruns de fragmento (peor caso)")
+    ap.add_argument("--drain", type=float, default=60.0, help="espera máxima de entregas al terminar (s)")
+    ap.add_argument("--env", action="append", default=[], metavar="K=V", help="variables extra para la app")
+    ap.add_argument("-o", "--output", help="guardar el reporte JSON")
+    args = ap.parse_args(argv)
+
+    hook = FakeWebhook(args.webhook_latency, args.webhook_jitter, args.webhook_error_rate)
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        proc = start_app(port, hook.url, tmp, dict(kv.split("=", 1) for kv in args.env))
+        try:
+            t0 = time.perf_counter()
+            stats = asyncio.run(run_users(args, port))
+            elapsed = time.perf_counter() - t0
+            # El envío es en background (outbox + flusher): esperamos a que llegue lo aceptado
+            deadline = time.monotonic() + args.drain
+            while len(hook.delivered) < stats["accepted"] and time.monotonic() < deadline:
+                time.sleep(0.2)
+            drained = time.perf_counter() - t0
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+    hook.close()
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "elapsed_s": round(elapsed, 2),
+        "throughput": {"reruns_per_s": round(len(stats["rerun"]) / elapsed, 2),
+                       "submits_per_s": round(len(stats["submit"]) / elapsed, 2)},
+        "rerun": percentiles(stats["rerun"]),
+        "submit": percentiles(stats["submit"]),
+        "submissions": {"accepted": stats["accepted"], "rejected": stats["rejected"], "errors": len(stats["errors"])},
+        "webhook": {"requests": hook.requests, "errors_injected": hook.errors, "delivered": len(hook.delivered),
+                    "success_ratio": round(len(hook.delivered) / stats["accepted"], 4) if stats["accepted"] else None,
+                    "drain_s": round(drained - elapsed, 2)},
+    }
+    out = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(out + "\n")
+    print(out)
+    for line in stats["errors"][:10]:
+        print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+# bench/rerun_bench.py
+# Benchmarks de rerun de app.py con streamlit.testing.v1.AppTest (sin navegador ni servidor).
+#
+#   python bench/rerun_bench.py -o bench/baseline.json                 # guardar baseline
+#   python bench/rerun_bench.py --baseline bench/baseline.json         # comparar (exit 1 si hay regresión)
+#   python bench/rerun_bench.py --sizes 1,50 --repeat 3                # corrida rápida
+#
+# Por escenario y tamaño (cantidad de bultos y de productos) mide el tiempo de pared por rerun (mediana),
+# el pico de memoria asignada (tracemalloc) y el tamaño de los protos emitidos (aprox. del delta enviado
+# al navegador). AppTest re-ejecuta siempre el script completo: los números son cota superior de un
+# rerun de fragmento.
+from __future__ import annotations
+import argparse, itertools, json, os, platform, statistics, sys, tempfile, threading, time, tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+sys.path.insert(0, ROOT)
+
+DEFAULT_SIZES = (1, 50, 500, 5000)
+ENGINE_SIZES = (1_000, 100_000)
+
+
+# -------------------- Webhook de mentira --------------------
+class _Stub(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub() -> ThreadingHTTPServer:
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Stub)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+def configure_env(tmp: str, stub_port: int):
+    # Sin límites de admisión (el bench dispara cientos de reruns) y con outbox y registro de envíos descartables
+    for name in ("PING", "PAGE", "SUBMIT"):
+        os.environ[f"GT_{name}_PER_MIN"] = "1e9"
+        os.environ[f"GT_{name}_BURST"] = "1e9"
+    os.environ["GT_SESSION_MAX_BYTES"] = str(1 << 40)
+    os.environ["GT_OUTBOX_PATH"] = os.path.join(tmp, "outbox.sqlite3")
+    os.environ["GT_SUBMISSIONS_PATH"] = os.path.join(tmp, "submissions.jsonl")  # no ensuciar data/ con envíos del bench
+    os.environ["N8N_WEBHOOK_URL"] = f"http://127.0.0.1:{stub_port}/hook"
+
+
+# -------------------- App --------------------
+def new_app(size: int):
+    from streamlit.testing.v1 import AppTest
+    from quoting import PesosIncrementales
+    from state_model import BultosStore, ProductosStore
+
+    bultos, productos = BultosStore(), ProductosStore()
+    for i in range(size):
+        bultos.append({"cant": 1 + i % 3, "ancho": 30 + i % 7, "alto": 20, "largo": 40})
+        productos.append({"descripcion": f"Producto {i}", "link": f"https://example.com/p/{i}"})
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.session_state["bultos"] = bultos
+    at.session_state["productos"] = productos
+    at.session_state["pesos_inc"] = PesosIncrementales(bultos.bultos())
+    at.session_state["nombre"] = "Bench"
+    at.session_state["email"] = "bench@example.com"
+    at.session_state["telefono"] = "11 5555 5555"
+    at.run()
+    return at
+
+
+def delta_bytes(at) -> int:
+    total = 0
+    stack = [at._tree]
+    while stack:
+        node = stack.pop()
+        proto = getattr(node, "proto", None)
+        if proto is not None:
+            total += proto.ByteSize()
+        children = getattr(node, "children", None)
+        if children:
+            stack.extend(children.values() if isinstance(children, dict) else children)
+    return total
+
+
+def button(at, label: str):
+    return next(b for b in at.button if b.label == label)
+
+
+# Cada escenario prepara el AppTest (sin medir) y devuelve la acción a medir
+def sc_rerun(at):
+    return at.run
+
+def sc_add_row(at):
+    return lambda: button(at, "➕ Agregar bulto").click().run()
+
+def sc_delete_row(at):
+    return lambda: button(at, "🗑️ Eliminar bulto").click().run()
+
+def sc_edit_field(at):
+    rid = at.session_state["bultos"].id(0)
+    widget = at.number_input(key=f"cant_{rid}")
+    return lambda: widget.set_value(widget.value + 1).run()
+
+def sc_submit(at):
+    # cada repetición es una solicitud nueva: con el mismo payload desde la segunda sólo se mide el descarte por dedupe
+    at.session_state["telefono"] = f"11 5555 {next(_ENVIOS):04d}"
+    return lambda: at.button(key="gt_submit_btn").click().run()
+
+_ENVIOS = itertools.count()
+
+SCENARIOS = {
+    "rerun": sc_rerun,
+    "add_row": sc_add_row,
+    "delete_row": sc_delete_row,
+    "edit_field": sc_edit_field,
+    "submit": sc_submit,
+}
+
+
+def measure(at, action) -> tuple[float, int]:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    action()
+    wall = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return wall, peak
+
+
+def bench_app(sizes, repeat: int) -> list[dict]:
+    results = []
+    for size in sizes:
+        for name, prepare in SCENARIOS.items():
+            walls, peaks = [], []
+            at = new_app(size)
+            for _ in range(repeat):
+                wall, peak = measure(at, prepare(at))
+                walls.append(wall)
+                peaks.append(peak)
+            results.append({
+                "scenario": name, "size": size,
+                "wall_ms": round(statistics.median(walls) * 1000, 3),
+                "peak_kb": round(max(peaks) / 1024, 1),
+                "delta_bytes": delta_bytes(at),
+            })
+            print(f"{name:>12} n={size:<6} {results[-1]['wall_ms']:>9.2f} ms  "
+                  f"{results[-1]['peak_kb']:>9.1f} KiB  {results[-1]['delta_bytes']:>8} B", file=sys.stderr)
+    return results
+
+
+# -------------------- Motor (sin Streamlit) --------------------
+def bench_engine(repeat: int) -> list[dict]:
+    import numpy as np
+    from quoting import Carrier, compare_carriers, compute_pesos, validate_form
+    from state_model import BultosStore
+    from validation import ValidacionIncremental
+
+    # tabla sintética: sólo importa la cantidad de couriers y que los parámetros varíen
+    carriers = tuple(Carrier(f"c{i}", 4000 + 500 * i, redondeo_kg=0.5 * (i % 3), min_pieza_kg=float(i % 2)) for i in range(5))
+    results = []
+    for size in ENGINE_SIZES:
+        store = BultosStore()
+        store.replace({"cant": np.ones(size), "ancho": np.full(size, 30.0), "alto": np.full(size, 20.0), "largo": np.full(size, 40.0)})
+        form = {"nombre": "B", "email": "b@x.com", "telefono": "1", "productos": [{"descripcion": "x", "link": "y"}]}
+        inc = ValidacionIncremental(store)
+        inc.producto(None, form["productos"][0])
+        fila = store.row(0)
+
+        def validar_edicion():
+            # una edición de fila y la lista de errores, como en un envío desde la app
+            inc.bulto(fila, fila)
+            return inc.errores(form)
+        for name, fn in (
+            ("compute_pesos", lambda: compute_pesos(store.bultos(), 10.0, 100.0)),
+            ("validate_form", lambda: validate_form(form, compute_pesos(store.bultos(), 10.0, 100.0))),
+            ("validacion_incremental", validar_edicion),
+            ("compare_carriers", lambda: compare_carriers(store.bultos(), 10.0, carriers)),
+        ):
+            walls = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                fn()
+                walls.append(time.perf_counter() - t0)
+            results.append({"scenario": name, "size": size, "wall_ms": round(statistics.median(walls) * 1000, 3)})
+    return results
+
+
+# -------------------- Comparación --------------------
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Regresiones: tiempo o memoria por encima de `threshold` x baseline, o delta más grande."""
+    base = {(r["scenario"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        b = base.get((r["scenario"], r["size"]))
+        if b is None:
+            continue
+        for metric, factor in (("wall_ms", threshold), ("peak_kb", threshold), ("delta_bytes", 1.0)):
+            if metric in r and metric in b and b[metric] > 0 and r[metric] > b[metric] * factor:
+                regressions.append(f"{r['scenario']} n={r['size']}: {metric} {b[metric]} -> {r[metric]}")
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmarks de rerun de app.py (AppTest).")
+    ap.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="bultos/productos por escenario")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("-o", "--output", help="guardar resultados JSON")
+    ap.add_argument("--baseline", help="JSON de una corrida anterior para comparar")
+    ap.add_argument("--threshold", type=float, default=1.25, help="factor tolerado sobre el baseline")
+    args = ap.parse_args(argv)
+
+    import streamlit
+    with tempfile.TemporaryDirectory() as tmp:
+        stub = start_stub()
+        configure_env(tmp, stub.server_address[1])
+        sizes = [int(s) for s in args.sizes.split(",") if s]
+        report = {
+            "meta": {"python": platform.python_version(), "streamlit": streamlit.__version__,
+                     "platform": platform.platform(), "repeat": args.repeat},
+            "results": bench_app(sizes, args.repeat) + bench_engine(args.repeat),
+        }
+        stub.shutdown()
+
+    out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for line in regressions:
+            print("REGRESIÓN", line, file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# bench/startup_profile.py
+# Arranque en frío medido desde afuera: levanta `streamlit run app.py` de cero, abre una sesión como el navegador
+# y reporta cuánto tardó el servidor en responder, el primer render y las fases que registra la app (startup.py).
+#
+#   python bench/startup_profile.py                       # 3 arranques, reporte JSON
+#   python bench/startup_profile.py --target-ms 4000      # exit 1 si el primer render pasa el objetivo
+from __future__ import annotations
+import argparse, asyncio, json, statistics, sys, tempfile, time, urllib.request
+
+from loadtest import FakeWebhook, Session, free_port, start_app
+
+
+async def first_render(port: int) -> float:
+    import websockets
+    async with websockets.connect(f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=["streamlit"], max_size=None) as ws:
+        return await Session(ws, full_reruns=True).rerun()
+
+
+def scrape(port: int) -> dict:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as r:
+        text = r.read().decode()
+    return {line.split('"')[1]: float(line.rsplit(" ", 1)[1])
+            for line in text.splitlines() if line.startswith("gt_startup_seconds{")}
+
+
+def run_once(hook: FakeWebhook) -> dict:
+    port, metrics_port = free_port(), free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        proc = start_app(port, hook.url, tmp, {"GT_METRICS_PORT": str(metrics_port)})
+        try:
+            ready = time.perf_counter() - t0
+            render = asyncio.run(first_render(port))
+            return {"server_ready_s": round(ready, 3), "first_render_s": round(render, 3),
+                    "spawn_to_first_render_s": round(time.perf_counter() - t0, 3), "app_phases": scrape(metrics_port)}
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Perfil de arranque en frío de app.py.")
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--target-ms", type=float, help="objetivo para spawn -> primer render (mediana)")
+    ap.add_argument("-o", "--output", help="guardar el reporte JSON")
+    args = ap.parse_args(argv)
+
+    hook = FakeWebhook()
+    runs = [run_once(hook) for _ in range(args.runs)]
+    hook.close()
+    median = statistics.median(r["spawn_to_first_render_s"] for r in runs)
+    report = {"runs": runs, "median_spawn_to_first_render_s": round(median, 3), "target_ms": args.target_ms}
+    out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(out + "\n")
+    print(out)
+    if args.target_ms and median * 1000 > args.target_ms:
+        print(f"Arranque en frío {median * 1000:.0f} ms > objetivo {args.target_ms:.0f} ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
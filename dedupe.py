@@ -0,0 +1,52 @@
+# dedupe.py
+# Idempotencia de envíos: misma solicitud (salvo timestamp) => misma key, y se descarta dentro de la ventana.
+from __future__ import annotations
+import hashlib, json, threading, time
+from collections import OrderedDict
+
+IGNORED_FIELDS = ("timestamp",)
+
+
+def idempotency_key(payload: dict) -> str:
+    """Hash del payload en forma canónica (claves ordenadas, sin espacios), sin los campos volátiles."""
+    canon = {k: v for k, v in payload.items() if k not in IGNORED_FIELDS}
+    raw = json.dumps(canon, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class DedupeCache:
+    """Cache TTL + LRU, thread-safe y compartido por todo el proceso."""
+
+    def __init__(self, ttl: float = 600.0, max_size: int = 10_000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen(self, key: str) -> bool:
+        """True si `key` ya pasó dentro de la ventana; si no, la registra. Chequeo y alta son atómicos."""
+        now = time.monotonic()
+        with self._lock:
+            expires = self._items.get(key)
+            if expires is not None and expires > now:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return True
+            self._items[key] = now + self.ttl
+            self._items.move_to_end(key)
+            self.misses += 1
+            # las más viejas quedan al principio: vencidas o sobrantes salen por ahí
+            while self._items and (len(self._items) > self.max_size or next(iter(self._items.values())) <= now):
+                self._items.popitem(last=False)
+            return False
+
+    def forget(self, key: str):
+        """Saca `key` de la ventana: la solicitud no llegó a guardarse y un reintento tiene que pasar."""
+        with self._lock:
+            self._items.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._items)}
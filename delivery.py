@@ -0,0 +1,299 @@
+# delivery.py
+# Envío de payloads al webhook (n8n) fuera del hilo del script de Streamlit.
+from __future__ import annotations
+import heapq, itertools, json, logging, threading, time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, NamedTuple
+
+from metrics import REGISTRY
+
+log = logging.getLogger("globaltrip.delivery")
+
+
+@dataclass
+class DeliveryConfig:
+    workers: int = 4
+    pool_size: int = 8
+    timeout: float = 10.0
+    max_retries: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    breaker_threshold: int = 5
+    breaker_cooldown: float = 30.0
+    # Máximo de envíos pendientes por endpoint (en cola, esperando reintento o en curso).
+    max_pending_per_endpoint: int = 32
+    # Envíos en curso a la vez por endpoint; siempre menos que `workers` para que uno lento no acapare el pool.
+    # 0 = workers - 1
+    max_concurrent_per_endpoint: int = 0
+    # Tope global de envíos en vuelo (todas las URLs); lo que exceda queda en el outbox para después.
+    max_inflight: int = 64
+
+
+class Entrega(NamedTuple):
+    ok: bool
+    msg: str
+    permanente: bool = False  # 4xx (salvo 401/403/408/429): reintentar va a dar la misma respuesta
+
+
+class CircuitBreaker:
+    """Breaker por endpoint: tras N fallos seguidos deja de intentar durante `cooldown`."""
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.failures < self.threshold:
+                return True
+            # half-open: dejamos pasar un intento cuando vence el cooldown
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def blocked(self) -> bool:
+        """Como `allow` pero sin consumir el intento half-open."""
+        with self._lock:
+            return self.failures >= self.threshold and time.monotonic() - self.opened_at < self.cooldown
+
+    def record(self, ok: bool):
+        with self._lock:
+            if ok:
+                self.failures = 0
+            else:
+                self.failures += 1
+                if self.failures >= self.threshold:
+                    self.opened_at = time.monotonic()
+
+
+@dataclass
+class _Envio:
+    url: str
+    body: str
+    headers: dict
+    ep: "_Endpoint"
+    future: Future
+    attempt: int = 0
+
+
+@dataclass
+class _Endpoint:
+    breaker: CircuitBreaker
+    pending: int = 0
+    running: int = 0
+    queue: deque = field(default_factory=deque)  # envíos listos esperando un lugar bajo el tope de concurrencia
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class DelayQueue:
+    """Un solo hilo que entrega cada item a `fn` cuando vence su demora: los reintentos esperan acá, no en un worker."""
+
+    def __init__(self, fn: Callable, name: str = "gt-webhook-retry"):
+        self.fn = fn
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, delay: float, item) -> bool:
+        """False si ya está cerrada: el item queda a cargo de quien lo quiso reprogramar."""
+        with self._cond:
+            if self._closed:
+                return False
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), item))
+            self._cond.notify()
+            return True
+
+    def close(self) -> list:
+        """Detiene el hilo y devuelve lo que quedaba esperando."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        with self._cond:
+            quedan, self._heap = [item for _, _, item in self._heap], []
+        return quedan
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                if self._closed:
+                    return
+                _, _, item = heapq.heappop(self._heap)
+            try:
+                self.fn(item)
+            except Exception:
+                log.exception("error reprogramando un envío")
+
+
+class WebhookSender:
+    """Pool de workers que postea JSON sobre una `requests.Session` compartida (keep-alive)."""
+
+    def __init__(self, config: DeliveryConfig | None = None):
+        self.config = config or DeliveryConfig()
+        self._executor = ThreadPoolExecutor(max_workers=self.config.workers, thread_name_prefix="gt-webhook")
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._endpoints: dict[str, _Endpoint] = {}
+        self._endpoints_lock = threading.Lock()
+        self._inflight = 0
+        self._inflight_lock = threading.Lock()
+        cfg = self.config
+        self._cap = max(1, min(cfg.max_concurrent_per_endpoint or cfg.workers - 1, cfg.workers - 1))
+        self._retries = DelayQueue(self._dispatch)
+        self._closed = False
+
+    # ---- Sesión HTTP compartida ----
+    def session(self):
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.config.pool_size, pool_maxsize=self.config.pool_size)
+                s.mount("http://", adapter)
+                s.mount("https://", adapter)
+                self._session = s
+            return self._session
+
+    def _endpoint(self, url: str) -> _Endpoint:
+        with self._endpoints_lock:
+            ep = self._endpoints.get(url)
+            if ep is None:
+                ep = _Endpoint(CircuitBreaker(self.config.breaker_threshold, self.config.breaker_cooldown))
+                self._endpoints[url] = ep
+            return ep
+
+    # ---- API ----
+    def submit(self, url: str, payload, headers: dict | None = None) -> Future | None:
+        """Encola el envío y vuelve enseguida. Devuelve None si el endpoint está saturado o con el breaker abierto.
+        El Future se resuelve con la `Entrega` final, después de los reintentos."""
+        ep = self._endpoint(url)
+        with ep.lock:
+            if ep.pending >= self.config.max_pending_per_endpoint:
+                log.warning("webhook %s saturado (%d pendientes), descartando envío", url, ep.pending)
+                return None
+            if ep.breaker.blocked():
+                log.warning("webhook %s con breaker abierto, descartando envío", url)
+                return None
+            with self._inflight_lock:
+                if self._inflight >= self.config.max_inflight:
+                    log.warning("%d envíos en vuelo, descartando envío", self._inflight)
+                    return None
+                self._inflight += 1
+            ep.pending += 1
+        # Serializamos acá: el payload puede referenciar estado de sesión que sigue mutando
+        envio = _Envio(url, json.dumps(payload), {"Content-Type": "application/json", **(headers or {})}, ep, Future())
+        envio.future.add_done_callback(lambda _f: self._release(ep))
+        self._dispatch(envio)
+        return envio.future
+
+    def inflight(self) -> int:
+        return self._inflight
+
+    def breakers_open(self) -> list[str]:
+        """Endpoints con el breaker abierto ahora mismo (para /health)."""
+        with self._endpoints_lock:
+            return [url for url, ep in self._endpoints.items() if ep.breaker.blocked()]
+
+    def shutdown(self, wait: bool = True):
+        # Lo que esperaba reintento o turno se resuelve como falla transitoria: el outbox lo vuelve a intentar
+        self._closed = True
+        for envio in self._retries.close():
+            envio.future.set_result(Entrega(False, "envío cancelado al apagar"))
+        self._executor.shutdown(wait=wait)
+        with self._endpoints_lock:
+            endpoints = list(self._endpoints.values())
+        for ep in endpoints:
+            with ep.lock:
+                quedan, ep.queue = list(ep.queue), deque()
+            for envio in quedan:
+                envio.future.set_result(Entrega(False, "envío cancelado al apagar"))
+        if self._session is not None:
+            self._session.close()
+
+    # ---- Internos ----
+    def _release(self, ep: _Endpoint):
+        with ep.lock:
+            ep.pending -= 1
+        with self._inflight_lock:
+            self._inflight -= 1
+
+    def _dispatch(self, envio: _Envio):
+        """Toma un worker si el endpoint está bajo su tope de concurrencia; si no, espera en la cola del endpoint."""
+        ep = envio.ep
+        with ep.lock:
+            if not self._closed and ep.running >= self._cap:
+                ep.queue.append(envio)
+                return
+            ep.running += 1
+        try:
+            if self._closed:
+                raise RuntimeError("sender apagado")
+            self._executor.submit(self._work, envio)
+        except RuntimeError:
+            with ep.lock:
+                ep.running -= 1
+            envio.future.set_result(Entrega(False, "envío cancelado al apagar"))
+
+    def _work(self, envio: _Envio):
+        # El worker sigue con la cola de su endpoint: el lugar bajo el tope pasa al siguiente sin volver a encolar
+        ep = envio.ep
+        while envio is not None:
+            try:
+                self._attempt(envio)
+            except Exception as e:  # no debería pasar, pero el Future no puede quedar sin resolver
+                log.exception("error enviando a %s", envio.url)
+                if not envio.future.done():
+                    envio.future.set_result(Entrega(False, str(e)))
+            with ep.lock:
+                envio = ep.queue.popleft() if ep.queue and not self._closed else None
+                if envio is None:
+                    ep.running -= 1
+
+    def _attempt(self, envio: _Envio):
+        """Un intento. Si falla y quedan reintentos, el envío vuelve después del backoff por la DelayQueue."""
+        cfg, ep, url = self.config, envio.ep, envio.url
+        if not ep.breaker.allow():
+            REGISTRY.inc("gt_webhook_requests_total", outcome="breaker_open")
+            log.warning("webhook %s falló: breaker abierto", url)
+            envio.future.set_result(Entrega(False, "breaker abierto"))
+            return
+        t0 = time.perf_counter()
+        try:
+            r = self.session().post(url, headers=envio.headers, data=envio.body, timeout=cfg.timeout)
+            REGISTRY.observe("gt_webhook_request_seconds", time.perf_counter() - t0)
+            msg = f"HTTP {r.status_code}"
+            if r.ok:
+                REGISTRY.inc("gt_webhook_requests_total", outcome="ok")
+                ep.breaker.record(True)
+                envio.future.set_result(Entrega(True, msg))
+                return
+            REGISTRY.inc("gt_webhook_requests_total", outcome=f"http_{r.status_code // 100}xx")
+            if r.status_code not in (401, 403, 408, 429) and r.status_code < 500:
+                # 4xx: no tiene sentido reintentar ni culpar al endpoint.
+                # 401/403 no: un token mal cargado o rotado se corrige, y mientras tanto actúan backoff y breaker
+                log.warning("webhook %s rechazó el envío: %s", url, msg)
+                envio.future.set_result(Entrega(False, msg, permanente=True))
+                return
+        except Exception as e:
+            REGISTRY.observe("gt_webhook_request_seconds", time.perf_counter() - t0)
+            REGISTRY.inc("gt_webhook_requests_total", outcome="error")
+            msg = str(e)
+        ep.breaker.record(False)
+        if envio.attempt < cfg.max_retries:
+            envio.attempt += 1
+            if self._retries.put(min(cfg.backoff_max, cfg.backoff_base * (2 ** (envio.attempt - 1))), envio):
+                return
+        log.warning("webhook %s falló: %s", url, msg)
+        envio.future.set_result(Entrega(False, msg))
@@ -0,0 +1,116 @@
+# importer.py
+# Importación de listas de empaque (CSV/XLSX) a columnas de bultos, sin Streamlit.
+# Se parsea por chunks con pandas y de forma vectorizada; los números aceptan coma decimal como `to_float`.
+# Las filas con errores se informan con su número de línea en el archivo y no se importan.
+from __future__ import annotations
+import csv, io, unicodedata
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+
+from quoting import MAX_CANT, MAX_MEDIDA_CM
+
+COLS = ("cant", "ancho", "alto", "largo")
+# Encabezados aceptados (normalizados: minúsculas, sin tildes, sin unidades)
+ALIASES = {
+    "cant": ("cant", "cantidad", "cantidades", "qty", "quantity", "piezas", "bultos", "cajas", "pcs", "ctns", "cartons"),
+    "ancho": ("ancho", "width", "w", "anch"),
+    "alto": ("alto", "altura", "height", "h"),
+    "largo": ("largo", "longitud", "length", "l", "long"),
+}
+NOMBRES = {"cant": "cantidad", "ancho": "ancho", "alto": "alto", "largo": "largo"}
+MAXIMOS = {"cant": MAX_CANT, "ancho": MAX_MEDIDA_CM, "alto": MAX_MEDIDA_CM, "largo": MAX_MEDIDA_CM}
+MAX_ERRORES = 200  # se cuentan todos, pero se listan como mucho estos
+
+
+@dataclass
+class Importacion:
+    columnas: dict[str, np.ndarray]
+    filas: int = 0                 # filas importadas
+    vacias: int = 0                # filas en blanco, salteadas
+    errores: list[tuple[int, str]] = field(default_factory=list)
+    total_errores: int = 0
+
+
+def _norm(nombre) -> str:
+    s = unicodedata.normalize("NFKD", str(nombre)).encode("ascii", "ignore").decode().lower()
+    s = s.split("(")[0].split("[")[0]
+    return "".join(ch for ch in s if ch.isalnum())
+
+
+def map_columns(headers) -> dict[str, str]:
+    """Encabezado del archivo para cada columna de bultos. ValueError si falta alguna."""
+    por_alias = {a: col for col, aliases in ALIASES.items() for a in aliases}
+    mapa = {}
+    for h in headers:
+        col = por_alias.get(_norm(h))
+        if col and col not in mapa:
+            mapa[col] = h
+    faltan = [c for c in COLS if c not in mapa]
+    if faltan:
+        raise ValueError(f"Faltan columnas: {', '.join(faltan)} (encabezados leídos: {', '.join(map(str, headers))}).")
+    return mapa
+
+
+def _numeros(col: pd.Series) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(valores, vacío, inválido). Vacío vale 0 como en `to_float`; coma decimal aceptada; "inf" no es un número."""
+    s = col.astype(str).str.strip()
+    vacio = s.eq("") | s.str.lower().isin(("nan", "none"))
+    num = pd.to_numeric(s.str.replace(",", ".", regex=False), errors="coerce").to_numpy(np.float64)
+    invalido = ~np.isfinite(num) & ~vacio.to_numpy()
+    return np.where(np.isfinite(num), num, 0.0), vacio.to_numpy(), invalido
+
+
+def _chunks(data: bytes, nombre: str, chunksize: int):
+    if nombre.lower().endswith((".xlsx", ".xlsm")):
+        # read_excel no lee por partes: se carga la hoja y se procesa por tramos igual que el CSV
+        df = pd.read_excel(io.BytesIO(data), dtype=str, keep_default_na=False)
+        for i in range(0, len(df), chunksize):
+            yield df.iloc[i:i + chunksize]
+        if not len(df):
+            yield df
+        return
+    texto = data.decode("utf-8-sig", errors="replace")
+    try:
+        sep = csv.Sniffer().sniff(texto[:4096], delimiters=",;\t|").delimiter
+    except csv.Error:
+        sep = ","
+    yield from pd.read_csv(io.StringIO(texto), sep=sep, dtype=str, keep_default_na=False,
+                           skip_blank_lines=False, skipinitialspace=True, chunksize=chunksize)
+
+
+def parse_packing_list(data: bytes, nombre: str, chunksize: int = 5000, max_filas: int | None = None) -> Importacion:
+    partes: dict[str, list[np.ndarray]] = {c: [] for c in COLS}
+    res = Importacion(columnas={})
+    linea = 2  # la 1 es el encabezado
+    mapa = None
+    for chunk in _chunks(data, nombre, chunksize):
+        mapa = mapa or map_columns(list(chunk.columns))
+        n = len(chunk)
+        valores, vacios, motivos = {}, np.ones(n, bool), []
+        for c in COLS:
+            v, vacio, inval = _numeros(chunk[mapa[c]])
+            valores[c] = v
+            vacios &= vacio
+            motivos.append((inval, f"{NOMBRES[c]} no es un número"))
+            motivos.append((v < 0, f"{NOMBRES[c]} negativo"))
+            motivos.append((v > MAXIMOS[c], f"{NOMBRES[c]} mayor a {MAXIMOS[c]:,.0f}"))
+        motivos.append((valores["cant"] != np.floor(valores["cant"]), "cantidad no es entera"))
+        malas = np.zeros(n, bool)
+        for mask, _ in motivos:
+            malas |= mask
+        malas &= ~vacios
+        for i in np.flatnonzero(malas):
+            res.total_errores += 1
+            if len(res.errores) < MAX_ERRORES:
+                res.errores.append((linea + int(i), "; ".join(m for mask, m in motivos if mask[i])))
+        ok = ~malas & ~vacios
+        res.vacias += int(vacios.sum())
+        res.filas += int(ok.sum())
+        if max_filas is not None and res.filas > max_filas:
+            raise ValueError(f"La lista tiene más de {max_filas} bultos.")
+        for c in COLS:
+            partes[c].append(valores[c][ok])
+        linea += n
+    res.columnas = {c: np.concatenate(partes[c]) if partes[c] else np.zeros(0) for c in COLS}
+    return res
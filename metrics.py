@@ -0,0 +1,206 @@
+# metrics.py
+# Métricas en memoria (contadores, histogramas, gauges) con salida en formato texto de Prometheus.
+# Registrar cuesta un dict lookup y una suma: se puede usar en el camino caliente de cada rerun.
+from __future__ import annotations
+import bisect, functools, hmac, ipaddress, json, os, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import OrderedDict, defaultdict
+from typing import Callable
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _num(v) -> str:
+    v = float(v)
+    return str(int(v)) if v.is_integer() else repr(v)
+
+
+def _fmt_labels(labels: tuple, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra: parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: dict[str, tuple[str, str]] = {}
+        self._counters: dict[str, dict[tuple, float]] = defaultdict(lambda: defaultdict(float))
+        self._hists: dict[str, dict[tuple, list]] = defaultdict(dict)
+        self._buckets: dict[str, tuple] = {}
+        self._gauges: dict[str, Callable[[], float | dict[tuple, float]]] = {}
+
+    # ---- definición ----
+    def counter(self, name: str, help: str):
+        self._help[name] = ("counter", help)
+
+    def histogram(self, name: str, help: str, buckets: tuple = DEFAULT_BUCKETS):
+        self._help[name] = ("histogram", help)
+        self._buckets[name] = buckets
+
+    def gauge(self, name: str, help: str, fn: Callable[[], float | dict], kind: str = "gauge"):
+        """El valor se calcula recién al exportar: no cuesta nada en cada rerun.
+        `kind="counter"` para exponer contadores que ya lleva otro objeto (p.ej. la cache de dedupe)."""
+        self._help[name] = (kind, help)
+        self._gauges[name] = fn
+
+    # ---- registro ----
+    def inc(self, name: str, value: float = 1.0, **labels):
+        with self._lock:
+            self._counters[name][_labels(labels)] += value
+
+    def observe(self, name: str, value: float, **labels):
+        buckets = self._buckets[name]
+        key = _labels(labels)
+        with self._lock:
+            h = self._hists[name].get(key)
+            if h is None:
+                h = self._hists[name][key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            h[0][bisect.bisect_left(buckets, value)] += 1
+            h[1] += value
+            h[2] += 1
+
+    def timed(self, name: str, **labels):
+        """Decorador: observa la duración de la función (también si sale por excepción, p.ej. st.stop)."""
+        def deco(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - t0, **labels)
+            return wrapper
+        return deco
+
+    # ---- exportación ----
+    def render(self) -> str:
+        out = []
+        with self._lock:
+            counters = {n: dict(v) for n, v in self._counters.items()}
+            hists = {n: {k: ([*h[0]], h[1], h[2]) for k, h in v.items()} for n, v in self._hists.items()}
+        for name, (kind, help) in sorted(self._help.items()):
+            out.append(f"# HELP {name} {help}")
+            out.append(f"# TYPE {name} {kind}")
+            if kind == "counter" and name not in self._gauges:
+                for key, v in counters.get(name, {}).items():
+                    out.append(f"{name}{_fmt_labels(key)} {_num(v)}")
+            elif kind == "histogram":
+                buckets = self._buckets[name]
+                for key, (counts, total, n) in hists.get(name, {}).items():
+                    acc = 0
+                    for le, c in zip((*buckets, "+Inf"), counts):
+                        acc += c
+                        le_label = f'le="{le}"'
+                        out.append(f"{name}_bucket{_fmt_labels(key, le_label)} {acc}")
+                    out.append(f"{name}_sum{_fmt_labels(key)} {_num(total)}")
+                    out.append(f"{name}_count{_fmt_labels(key)} {n}")
+            else:
+                try:
+                    v = self._gauges[name]()
+                except Exception:
+                    continue
+                for key, val in (v.items() if isinstance(v, dict) else [((), v)]):
+                    out.append(f"{name}{_fmt_labels(key)} {_num(val)}")
+        return "\n".join(out) + "\n"
+
+
+def process_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # sin /proc (macOS): el pico, no el actual
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class SessionTracker:
+    """Sesiones vistas en los últimos `window` segundos (aprox. de sesiones activas).
+    Ordenadas por último acceso: las vencidas quedan al principio y se podan en cada `touch`, se scrapee o no."""
+
+    def __init__(self, window: float = 300.0):
+        self.window = window
+        self._seen: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def touch(self, session_id: str):
+        now = time.monotonic()
+        with self._lock:
+            self._seen[session_id] = now
+            self._seen.move_to_end(session_id)
+            self._prune(now)
+
+    def active(self) -> int:
+        with self._lock:
+            self._prune(time.monotonic())
+            return len(self._seen)
+
+    def _prune(self, now: float):
+        cutoff = now - self.window
+        while self._seen and next(iter(self._seen.values())) < cutoff:
+            self._seen.popitem(last=False)
+
+
+def _loopback(host: str) -> bool:
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:  # "" (todas las interfaces) o un nombre
+        return host == "localhost"
+
+
+def serve(port: int, registry: Registry | None = None, host: str = "127.0.0.1", token: str = "",
+          health: Callable[[], tuple[bool, dict]] | None = None) -> ThreadingHTTPServer:
+    """Servidor HTTP mínimo en otro puerto: /metrics para Prometheus y /health para el uptime monitor.
+    Escucha sólo en loopback salvo que se pida otro `host`; con `token` exige `Authorization: Bearer <token>`.
+    `health` devuelve (ok, detalle): /health responde 200 o 503 con el detalle en JSON."""
+    registry = registry or REGISTRY
+    if not token and not _loopback(host):
+        raise ValueError(f"métricas en {host or '*'}:{port} sin token: definir un token o escuchar en 127.0.0.1")
+    esperado = f"Bearer {token}".encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if token and not hmac.compare_digest(self.headers.get("Authorization", "").encode(), esperado):
+                self.send_error(401)
+                return
+            status = 200
+            if self.path.startswith("/metrics"):
+                body, ctype = registry.render().encode(), "text/plain; version=0.0.4"
+            elif self.path.startswith("/health"):
+                try:
+                    ok, detalle = health() if health else (True, {})
+                except Exception as e:  # si el chequeo mismo falla, el proceso no está sano
+                    ok, detalle = False, {"error": str(e)}
+                status = 200 if ok else 503
+                body, ctype = json.dumps({"ok": ok, **detalle}).encode() + b"\n", "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(status)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="gt-metrics", daemon=True).start()
+    return server
+
+
+REGISTRY = Registry()
+SESSIONS = SessionTracker()
+
+REGISTRY.histogram("gt_section_seconds", "Duración de cada sección del formulario por rerun.")
+REGISTRY.histogram("gt_webhook_request_seconds", "Duración de cada POST al webhook (por intento).")
+REGISTRY.counter("gt_webhook_requests_total", "POSTs al webhook por resultado.")
+REGISTRY.counter("gt_submissions_total", "Solicitudes de cotización por resultado.")
+REGISTRY.gauge("gt_active_sessions", "Sesiones con actividad en los últimos 5 minutos.", SESSIONS.active)
+REGISTRY.gauge("gt_process_rss_bytes", "Memoria residente del proceso.", process_rss_bytes)
@@ -0,0 +1,222 @@
+# outbox.py
+# Outbox local y durable (SQLite en modo WAL) + flusher que lo drena hacia el webhook.
+from __future__ import annotations
+import contextlib, hashlib, json, logging, os, sqlite3, threading, time
+from collections import defaultdict
+from typing import Callable
+
+from delivery import WebhookSender
+
+log = logging.getLogger("globaltrip.outbox")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox(
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  url TEXT NOT NULL,
+  headers TEXT NOT NULL,
+  payload TEXT NOT NULL,
+  idem_key TEXT,
+  created REAL NOT NULL,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  next_try REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS outbox_next_try ON outbox(next_try, id);
+CREATE TABLE IF NOT EXISTS outbox_dead(
+  id INTEGER PRIMARY KEY,
+  url TEXT NOT NULL,
+  headers TEXT NOT NULL,
+  payload TEXT NOT NULL,
+  idem_key TEXT,
+  created REAL NOT NULL,
+  attempts INTEGER NOT NULL,
+  failed_at REAL NOT NULL,
+  error TEXT NOT NULL
+);
+"""
+# Credenciales: no se guardan en el outbox; el flusher las agrega al enviar (así una rotación aplica a lo encolado)
+SECRET_HEADERS = ("authorization",)
+
+
+def _sin_secretos(headers: dict | None) -> dict:
+    return {k: v for k, v in (headers or {}).items() if k.lower() not in SECRET_HEADERS}
+
+
+class Outbox:
+    """Cola persistente: cada payload se escribe (y se sincroniza a disco) antes de intentar enviarlo."""
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # auto_vacuum tiene que quedar seteado antes de crear las tablas
+        self._db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.executescript(_SCHEMA)
+        cols = {r[1] for r in self._db.execute("PRAGMA table_info(outbox)")}
+        if "idem_key" not in cols:  # outbox creado por una versión anterior
+            self._db.execute("ALTER TABLE outbox ADD COLUMN idem_key TEXT")
+        # versiones anteriores guardaban el token junto a cada entrada
+        for id_, headers in self._db.execute("SELECT id, headers FROM outbox").fetchall():
+            limpio = json.dumps(_sin_secretos(json.loads(headers)), sort_keys=True)
+            if limpio != headers:
+                self._db.execute("UPDATE outbox SET headers = ? WHERE id = ?", (limpio, id_))
+
+    def append(self, url: str, payload: dict, headers: dict | None = None, idem_key: str | None = None) -> int:
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO outbox(url, headers, payload, idem_key, created) VALUES (?,?,?,?,?)",
+                (url, json.dumps(_sin_secretos(headers), sort_keys=True), json.dumps(payload), idem_key, time.time()),
+            )
+            return cur.lastrowid
+
+    def due(self, limit: int) -> list[tuple[int, str, str, str, str | None]]:
+        """Entradas listas para enviar: (id, url, headers_json, payload_json, idem_key)."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, url, headers, payload, idem_key FROM outbox WHERE next_try <= ? ORDER BY id LIMIT ?",
+                (time.time(), limit),
+            ).fetchall()
+
+    def ack(self, ids: list[int]):
+        if not ids: return
+        with self._lock:
+            self._db.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+    def retry_later(self, ids: list[int], base: float = 5.0, cap: float = 600.0):
+        # Fallas transitorias (red, 5xx, 429): no se descartan, sólo se espacian los reintentos
+        if not ids: return
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "UPDATE outbox SET attempts = attempts + 1, "
+                "next_try = ? + MIN(?, ? * (1 << MIN(attempts, 16))) WHERE id = ?",
+                [(now, cap, base, i) for i in ids],
+            )
+
+    def dead_letter(self, ids: list[int], error: str):
+        """Fallas permanentes (4xx salvo 401/403/408/429): salen de la cola a `outbox_dead`, donde quedan para revisarlas y reencolarlas con `revive` (vista ?admin)."""
+        if not ids: return
+        with self._lock, self._tx():
+            self._db.executemany(
+                "INSERT OR REPLACE INTO outbox_dead SELECT id, url, headers, payload, idem_key, created, attempts + 1, ?, ? "
+                "FROM outbox WHERE id = ?", [(time.time(), error, i) for i in ids])
+            self._db.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+    def revive(self, ids: list[int] | None = None) -> int:
+        """Vuelve a encolar entradas muertas (todas si `ids` es None), p.ej. después de corregir el webhook."""
+        if ids is not None and not ids: return 0
+        where, args = ("", []) if ids is None else (f" WHERE id IN ({','.join('?' * len(ids))})", list(ids))
+        with self._lock, self._tx():
+            n = self._db.execute("INSERT INTO outbox(url, headers, payload, idem_key, created) "
+                                 "SELECT url, headers, payload, idem_key, created FROM outbox_dead" + where, args).rowcount
+            self._db.execute("DELETE FROM outbox_dead" + where, args)
+        return n
+
+    @contextlib.contextmanager
+    def _tx(self):
+        # La conexión es compartida (autocommit): si algo falla a mitad no puede quedar con la transacción abierta
+        self._db.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def dead(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox_dead").fetchone()[0]
+
+    def compact(self):
+        """Libera las páginas de entradas ya entregadas y trunca el WAL."""
+        with self._lock:
+            self._db.execute("PRAGMA incremental_vacuum")
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class OutboxFlusher:
+    """Hilo que drena el outbox en lotes. Con `batch=True` manda muchas cotizaciones en un solo POST (lista JSON)."""
+
+    def __init__(self, outbox: Outbox, sender: WebhookSender, batch: bool = False,
+                 batch_size: int = 25, interval: float = 5.0, auth: Callable[[], dict] | None = None):
+        self.outbox = outbox
+        self.sender = sender
+        self.auth = auth or dict  # headers de credenciales vigentes, se consultan en cada envío
+        self.batch = batch
+        self.batch_size = batch_size
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="gt-outbox-flusher", daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def alive(self) -> bool:
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    def stop(self, timeout: float | None = None):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.flush()
+            except Exception:
+                log.exception("error drenando el outbox")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def flush(self) -> int:
+        """Drena todo lo que esté vencido. Devuelve la cantidad de entradas entregadas."""
+        delivered = 0
+        while not self._stop.is_set():
+            entries = self.outbox.due(self.batch_size)
+            if not entries:
+                break
+            groups = defaultdict(list)
+            for id_, url, headers, payload, key in entries:
+                groups[(url, headers)].append((id_, json.loads(payload), key))
+            sends = []
+            for (url, headers), items in groups.items():
+                hdrs = {**json.loads(headers), **self.auth()}
+                if self.batch:
+                    # la key del lote deriva de las keys de sus cotizaciones: reintentar el mismo lote repite la key
+                    batch_key = hashlib.sha256("".join(k or "" for _, _, k in items).encode()).hexdigest()
+                    sends.append(([i for i, _, _ in items],
+                                  self.sender.submit(url, [p for _, p, _ in items], {**hdrs, "Idempotency-Key": batch_key})))
+                else:
+                    sends.extend(([i], self.sender.submit(url, p, {**hdrs, "Idempotency-Key": k} if k else hdrs))
+                                 for i, p, k in items)
+            ok_ids, failed_ids, dead = [], [], 0
+            for ids, fut in sends:
+                res = fut.result() if fut is not None else None
+                if res is not None and res.permanente:
+                    # reintentar no cambia la respuesta (payload rechazado, credenciales): no se traba la cola
+                    log.warning("webhook rechazó %d entradas (%s): pasan a outbox_dead", len(ids), res.msg)
+                    self.outbox.dead_letter(ids, res.msg)
+                    dead += len(ids)
+                    continue
+                (ok_ids if res is not None and res.ok else failed_ids).extend(ids)
+            self.outbox.ack(ok_ids)
+            self.outbox.retry_later(failed_ids)
+            delivered += len(ok_ids)
+            if not ok_ids and not dead:
+                break
+        if delivered and self.outbox.depth() == 0:
+            self.outbox.compact()
+        return delivered
@@ -0,0 +1,297 @@
+# quoting.py
+# Núcleo de la cotización: pesos, validación y armado del payload (sin dependencias de Streamlit).
+# Un "form" es un dict con los mismos campos que el formulario de app.py:
+#   nombre, email, telefono, pais_origen, pais_origen_otro, productos, bultos, peso_bruto, valor_mercaderia
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime
+import json
+import numpy as np
+
+FACTOR_VOL = 5000
+MAX_PESO_BULTO_KG = 50.0
+MAX_VALOR_USD = 3000.0
+# Rangos de carga (no son reglas del courier): lo que entra al modelo de bultos tiene que caber en sus columnas
+MAX_CANT = 1_000_000
+MAX_MEDIDA_CM = 10_000.0
+
+
+def to_float(s, default=0.0):
+    try:
+        return float(str(s).replace(",",".")) if s not in (None,"") else default
+    except:
+        return default
+
+
+def to_array(values, dtype=np.float64) -> np.ndarray:
+    """Columna numérica. Camino rápido si ya son números; si no, parsea cada valor como `to_float`."""
+    try:
+        arr = np.asarray(values, dtype=dtype)
+        if arr.ndim == 1 and (arr.dtype.kind != "f" or np.isfinite(arr).all()):
+            return arr
+    except (TypeError, ValueError):
+        pass
+    return np.fromiter((to_float(v) for v in values), dtype=dtype, count=len(values))
+
+
+@dataclass
+class Bultos:
+    """Bultos en formato columnar: una columna por campo."""
+    cant: np.ndarray
+    ancho: np.ndarray
+    alto: np.ndarray
+    largo: np.ndarray
+
+    @classmethod
+    def from_rows(cls, rows: list[dict]) -> "Bultos":
+        return cls(*(to_array([r.get(k, 0) for r in rows]) for k in ("cant", "ancho", "alto", "largo")))
+
+    def __len__(self):
+        return len(self.cant)
+
+
+@dataclass
+class Pesos:
+    vol_por_fila: np.ndarray       # peso volumétrico de cada fila (cant * medidas / factor)
+    fila_valida: np.ndarray        # fila con cantidad y alguna medida cargada
+    total_vol: float
+    bruto: float
+    aplicable: float
+    excede_peso_bulto: bool        # bruto promedio por pieza > MAX_PESO_BULTO_KG (es de la solicitud, no de una fila)
+    excede_valor: bool
+
+
+def compute_pesos(b: Bultos, peso_bruto: float = 0.0, valor_usd: float = 0.0, factor: float = FACTOR_VOL) -> Pesos:
+    """Peso volumétrico por fila, total, aplicable (`max(vol, bruto)`) y reglas del courier en una sola pasada.
+    Las reglas son marcas (ver `avisos`), no errores: el tope por bulto es de peso bruto, no volumétrico."""
+    vol_fila = b.cant * ((b.ancho * b.alto * b.largo) / factor)
+    total_vol = round(float(vol_fila.sum()), 2)
+    piezas = float(b.cant.sum())
+    # Sólo conocemos el bruto total: el promedio por pieza es lo único que se puede comparar con el tope
+    bruto_pieza = peso_bruto / piezas if piezas > 0 else 0.0
+    return Pesos(
+        vol_por_fila=vol_fila,
+        fila_valida=(b.cant > 0) & ((b.ancho + b.alto + b.largo) > 0),
+        total_vol=total_vol,
+        bruto=peso_bruto,
+        aplicable=max(total_vol, peso_bruto),
+        excede_peso_bulto=bruto_pieza > MAX_PESO_BULTO_KG,
+        excede_valor=valor_usd > MAX_VALOR_USD,
+    )
+
+
+# -------------------- Couriers --------------------
+@dataclass(frozen=True)
+class Carrier:
+    nombre: str
+    divisor: float              # cm³ por kg volumétrico
+    redondeo_kg: float = 0.0    # el aplicable se redondea hacia arriba a este múltiplo (0 = sin redondeo)
+    min_pieza_kg: float = 0.0   # peso mínimo facturable por pieza
+
+
+def load_carriers(path: str) -> tuple[Carrier, ...]:
+    """Tabla de couriers desde JSON ({"couriers": [{"nombre", "divisor", "redondeo_kg", "min_pieza_kg"}]},
+    formato en assets/couriers.example.json). No hay tabla por defecto: sin archivo no se compara."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    carriers = tuple(
+        Carrier(str(c["nombre"]), float(c["divisor"]), float(c.get("redondeo_kg", 0.0)), float(c.get("min_pieza_kg", 0.0)))
+        for c in data["couriers"]
+    )
+    for c in carriers:
+        if c.divisor <= 0 or c.redondeo_kg < 0 or c.min_pieza_kg < 0:
+            raise ValueError(f"courier {c.nombre!r}: divisor, redondeo o mínimo inválidos")
+    return carriers
+
+
+def compare_carriers(b: Bultos, peso_bruto: float = 0.0, carriers: tuple[Carrier, ...] = ()) -> list[dict]:
+    """Volumétrico y aplicable de cada courier, de menor a mayor aplicable.
+    Una sola pasada: matriz couriers x filas con broadcasting y un producto matriz-vector por `cant`."""
+    if not carriers:
+        return []
+    div = np.array([c.divisor for c in carriers], dtype=np.float64)[:, None]
+    minimo = np.array([c.min_pieza_kg for c in carriers], dtype=np.float64)[:, None]
+    redondeo = np.array([c.redondeo_kg for c in carriers], dtype=np.float64)
+    cant = np.asarray(b.cant, dtype=np.float64)
+    vol_pieza = (b.ancho * b.alto * b.largo)[None, :] / div
+    vol = vol_pieza @ cant
+    aplicable = np.maximum(np.maximum(vol_pieza, minimo) @ cant, peso_bruto)
+    paso = np.where(redondeo > 0, redondeo, 1.0)
+    aplicable = np.where(redondeo > 0, np.ceil(aplicable / paso - 1e-9) * paso, aplicable)
+    orden = np.argsort(aplicable, kind="stable")
+    return [
+        {"courier": carriers[i].nombre, "divisor": carriers[i].divisor, "ranking": pos + 1,
+         "volumetrico_kg": round(float(vol[i]), 2), "aplicable_kg": round(float(aplicable[i]), 2)}
+        for pos, i in enumerate(orden)
+    ]
+
+
+# -------------------- Validación --------------------
+@dataclass(frozen=True)
+class ErrorValidacion:
+    campo: str                  # nombre, email, telefono, productos, pais_origen_otro, bultos, valor_mercaderia
+    codigo: str                 # requerido, invalido, excede_peso, excede_valor
+    mensaje: str
+    filas: tuple[int, ...] = () # filas involucradas (1-based), para bultos
+
+    @property
+    def texto(self) -> str:
+        return f"• {self.mensaje}"
+
+    def to_dict(self) -> dict:
+        return {"campo": self.campo, "codigo": self.codigo, "mensaje": self.mensaje, "filas": list(self.filas)}
+
+
+# Una regla por campo o fila: las usan la validación completa (`validar`) y la incremental (validation.py)
+def error_nombre(v) -> ErrorValidacion | None:
+    return None if (v or "").strip() else ErrorValidacion("nombre", "requerido", "Nombre es obligatorio.")
+
+
+def error_email(v) -> ErrorValidacion | None:
+    email = (v or "").strip()
+    return None if email and "@" in email else ErrorValidacion("email", "invalido", "Email válido es obligatorio.")
+
+
+def error_telefono(v) -> ErrorValidacion | None:
+    return None if (v or "").strip() else ErrorValidacion("telefono", "requerido", "Teléfono es obligatorio.")
+
+
+def error_pais(pais_origen, pais_origen_otro) -> ErrorValidacion | None:
+    if (pais_origen or "China") == "Otro" and not (pais_origen_otro or "").strip():
+        return ErrorValidacion("pais_origen_otro", "requerido", "Indicá el país de origen.")
+    return None
+
+
+def producto_valido(p: dict) -> bool:
+    return bool((p.get("descripcion") or "").strip() and (p.get("link") or "").strip())
+
+
+def error_productos(hay_validos: bool) -> ErrorValidacion | None:
+    return None if hay_validos else ErrorValidacion("productos", "requerido", "Cargá al menos un producto con descripción y link.")
+
+
+def error_bultos(hay_validos: bool) -> ErrorValidacion | None:
+    return None if hay_validos else ErrorValidacion("bultos", "requerido", "Ingresá al menos un bulto con cantidad y medidas.")
+
+
+def validar(f: dict, pesos: Pesos) -> list[ErrorValidacion]:
+    """Validación completa de un form, en el orden en que se muestran los errores."""
+    errs = [
+        error_nombre(f.get("nombre")),
+        error_email(f.get("email")),
+        error_telefono(f.get("telefono")),
+        error_productos(any(producto_valido(p) for p in f.get("productos") or [])),
+        error_pais(f.get("pais_origen", "China"), f.get("pais_origen_otro")),
+        error_bultos(bool(pesos.fila_valida.any())),
+    ]
+    return [e for e in errs if e]
+
+
+# Topes del courier: se avisan al usuario y viajan en el payload, pero no frenan el envío.
+# Son de la solicitud entera (`filas` vacío): el bruto se carga como total, no por bulto
+AVISO_PESO_BULTO = ErrorValidacion("bultos", "excede_peso",
+                                   f"El peso bruto promedio por pieza supera los {MAX_PESO_BULTO_KG:g} kg por bulto permitidos por el courier.")
+AVISO_VALOR = ErrorValidacion("valor_mercaderia", "excede_valor", f"El valor total supera los {MAX_VALOR_USD:,.0f} USD permitidos por el courier.")
+
+
+def avisos(pesos: Pesos) -> list[ErrorValidacion]:
+    avs = [
+        AVISO_PESO_BULTO if pesos.excede_peso_bulto else None,
+        AVISO_VALOR if pesos.excede_valor else None,
+    ]
+    return [a for a in avs if a]
+
+
+def validate_form(f: dict, pesos: Pesos) -> list[str]:
+    return [e.texto for e in validar(f, pesos)]
+
+
+# -------------------- Payload --------------------
+def productos_validos(productos: list[dict]) -> list[dict]:
+    return [
+        {"descripcion": (p.get("descripcion") or "").strip(), "link": (p.get("link") or "").strip()}
+        for p in productos if producto_valido(p)
+    ]
+
+
+def normalize_bulto(r: dict) -> dict:
+    return {"cant": int(to_float(r.get("cant"))), "ancho": to_float(r.get("ancho")),
+            "alto": to_float(r.get("alto")), "largo": to_float(r.get("largo"))}
+
+
+def pais_final(f: dict) -> str:
+    return "China" if f.get("pais_origen", "China") == "China" else (f.get("pais_origen_otro") or "").strip()
+
+
+def build_payload(f: dict, pesos: Pesos, timestamp: str | None = None, estimacion: dict | None = None,
+                  couriers: list[dict] | None = None) -> dict:
+    return {
+        "timestamp": timestamp or datetime.utcnow().isoformat(),
+        "origen": "streamlit-cotizador",
+        "factor_vol": FACTOR_VOL,
+        "contacto": {
+            "nombre": (f.get("nombre") or "").strip(),
+            "email": (f.get("email") or "").strip(),
+            "telefono": (f.get("telefono") or "").strip()
+        },
+        "pais_origen": pais_final(f),
+        "productos": productos_validos(f.get("productos") or []),
+        "bultos": [normalize_bulto(r) for r in f.get("bultos") or []],
+        "pesos": {
+            "volumetrico_kg": pesos.total_vol,
+            "bruto_kg": pesos.bruto,
+            "aplicable_kg": pesos.aplicable,
+            "couriers": couriers or []  # compare_carriers: ranking por peso aplicable
+        },
+        "valor_mercaderia_usd": f.get("valor_mercaderia", 0.0),
+        "avisos": [a.to_dict() for a in avisos(pesos)],  # topes del courier superados (no bloquean)
+        "estimacion": estimacion  # precio del tarifario local (tariffs.py), None si no hay
+    }
+
+
+def quote(f: dict, timestamp: str | None = None, carriers: tuple[Carrier, ...] = ()) -> dict:
+    """Valida y cotiza un form. Devuelve {"ok", "errores", "detalle", "avisos", "payload"} (payload sólo si es válido).
+    `errores` son los textos que ve el usuario; `detalle`, los mismos errores como objetos (`ErrorValidacion.to_dict`);
+    `avisos`, los topes del courier superados, también como objetos (no invalidan el registro)."""
+    bultos = f.get("bultos") or []
+    peso_bruto = to_float(f.get("peso_bruto"), 0.0)
+    valor = to_float(f.get("valor_mercaderia"), 0.0)
+    f = {**f, "peso_bruto": peso_bruto, "valor_mercaderia": valor}
+    b = Bultos.from_rows(bultos)
+    pesos = compute_pesos(b, peso_bruto, valor)
+    errores = validar(f, pesos)
+    return {
+        "ok": not errores,
+        "errores": [e.texto for e in errores],
+        "detalle": [e.to_dict() for e in errores],
+        "avisos": [a.to_dict() for a in avisos(pesos)],
+        "payload": None if errores else build_payload(f, pesos, timestamp, couriers=compare_carriers(b, peso_bruto, carriers)),
+    }
+
+
+class PesosIncrementales:
+    """Totales de peso mantenidos fila a fila: editar un bulto cuesta O(1) en vez de recalcular todo.
+    Sólo guarda escalares; quien edita la fila pasa los valores anteriores y los nuevos."""
+
+    def __init__(self, b: Bultos | None = None, factor: float = FACTOR_VOL):
+        self.factor = factor
+        self.total_vol = self.piezas = 0.0
+        if b is not None and len(b):
+            self.total_vol = float((b.cant * (b.ancho * b.alto * b.largo) / factor).sum())
+            self.piezas = float(b.cant.sum())
+
+    def add(self, r: dict, sign: int = +1):
+        cant = to_float(r.get("cant"))
+        vol_pieza = to_float(r.get("ancho")) * to_float(r.get("alto")) * to_float(r.get("largo")) / self.factor
+        self.total_vol += sign * cant * vol_pieza
+        self.piezas += sign * cant
+
+    def update(self, old: dict, new: dict):
+        self.add(old, -1)
+        self.add(new, +1)
+
+    def resumen(self, peso_bruto: float) -> tuple[float, float, bool]:
+        """(volumétrico total, aplicable, hay bultos excedidos) con la misma regla que `compute_pesos`."""
+        total_vol = round(max(self.total_vol, 0.0), 2)
+        bruto_pieza = peso_bruto / self.piezas if self.piezas > 0 else 0.0
+        return total_vol, max(total_vol, peso_bruto), bruto_pieza > MAX_PESO_BULTO_KG
@@ -0,0 +1,64 @@
+# ratelimit.py
+# Admisión por cliente: token bucket en memoria, compartido por todo el proceso.
+from __future__ import annotations
+import ipaddress, threading, time
+from collections import OrderedDict
+
+
+def parse_networks(spec: str) -> tuple:
+    """"10.0.0.0/8, 127.0.0.1" -> redes; lo que no se entienda se ignora."""
+    nets = []
+    for part in (spec or "").split(","):
+        try:
+            if part.strip(): nets.append(ipaddress.ip_network(part.strip(), strict=False))
+        except ValueError:
+            pass
+    return tuple(nets)
+
+
+def _en(ip: str, nets) -> bool:
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    addr = getattr(addr, "ipv4_mapped", None) or addr  # "::ffff:127.0.0.1" en sockets dual-stack
+    return any(addr in n for n in nets)
+
+
+def client_address(peer: str, forwarded_for: str, trusted) -> str:
+    """IP del cliente para el rate limit. X-Forwarded-For lo puede escribir cualquiera: sólo se lee si la conexión
+    viene de un proxy de confianza, y de derecha a izquierda (el cliente es el primer salto que no es un proxy nuestro)."""
+    if not _en(peer, trusted):
+        return peer
+    for hop in reversed([h.strip() for h in (forwarded_for or "").split(",") if h.strip()]):
+        if not _en(hop, trusted):
+            return hop
+    return peer
+
+
+class TokenBucketLimiter:
+    """`per_minute` tokens por minuto y hasta `burst` acumulados, por cada key (cliente)."""
+
+    def __init__(self, per_minute: float, burst: float, max_keys: int = 10_000):
+        self.rate = per_minute / 60.0
+        self.burst = float(burst)
+        self.max_keys = max_keys
+        self.rejected = 0
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key: str, cost: float = 1.0) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            ok = tokens >= cost
+            if ok:
+                tokens -= cost
+            else:
+                self.rejected += 1
+            self._buckets[key] = (tokens, now)
+            # clientes que no volvieron salen primero; su bucket ya estaría lleno de todos modos
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return ok
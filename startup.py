@@ -0,0 +1,62 @@
+# startup.py
+# Perfil de arranque en frío: tiempo de imports, del primer render y desde que arrancó el proceso.
+# La plataforma duerme la app si no hay tráfico; el primer visitante paga todo esto.
+from __future__ import annotations
+import importlib, os, sys, threading, time
+
+
+def process_age() -> float | None:
+    """Segundos desde que arrancó el proceso (Linux); None si no se puede saber."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupProfile:
+    def __init__(self):
+        self.imports: dict[str, float] = {}   # módulo -> segundos de su primer import
+        self.phases: dict[str, float] = {}    # fase -> segundos (se registra sólo la primera vez)
+        self._lock = threading.Lock()
+
+    def lazy_import(self, name: str):
+        """Importa `name` recién cuando se usa y anota cuánto tardó la primera vez."""
+        mod = sys.modules.get(name)
+        if mod is not None:
+            return mod
+        t0 = time.perf_counter()
+        mod = importlib.import_module(name)
+        with self._lock:
+            self.imports.setdefault(name, time.perf_counter() - t0)
+        return mod
+
+    def phase(self, name: str, seconds: float):
+        with self._lock:
+            self.phases.setdefault(name, seconds)
+
+    def first_render(self, seconds: float):
+        if "first_render" in self.phases:
+            return
+        self.phase("first_render", seconds)
+        age = process_age()
+        if age is not None:
+            self.phase("process_to_first_render", age)
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "phases": {k: round(v, 4) for k, v in self.phases.items()},
+                "lazy_imports": {k: round(v, 4) for k, v in sorted(self.imports.items(), key=lambda kv: -kv[1])},
+                "modules_loaded": len(sys.modules),
+            }
+
+
+PROFILE = StartupProfile()
+
+from metrics import REGISTRY
+REGISTRY.gauge("gt_startup_seconds", "Arranque en frío por fase (imports, primer render, proceso hasta primer render).",
+               lambda: {(("phase", k),): v for k, v in PROFILE.report()["phases"].items()})
@@ -0,0 +1,171 @@
+# state_model.py
+# Modelo compacto del formulario: una única copia de bultos y productos por sesión.
+# Cada fila tiene un id estable; las keys de widget se arman con ese id (no con la posición),
+# así borrar una fila no corre las keys de las siguientes.
+from __future__ import annotations
+import numpy as np
+
+from quoting import MAX_CANT, MAX_MEDIDA_CM, Bultos, to_float
+
+
+class BultosStore:
+    """Bultos en columnas numpy con capacidad creciente (append amortizado O(1))."""
+
+    COLS = ("cant", "ancho", "alto", "largo")
+    _DTYPES = {"cant": np.int32, "ancho": np.float64, "alto": np.float64, "largo": np.float64}
+    MAXIMOS = {"cant": MAX_CANT, "ancho": MAX_MEDIDA_CM, "alto": MAX_MEDIDA_CM, "largo": MAX_MEDIDA_CM}
+
+    def __init__(self, capacity: int = 8):
+        self._n = 0
+        self._next_id = 0
+        self._alloc(capacity)
+
+    def _alloc(self, capacity: int):
+        self._cols = {k: np.zeros(capacity, dt) for k, dt in self._DTYPES.items()}
+        self._ids = np.zeros(capacity, np.int64)
+
+    def _grow(self, need: int):
+        cap = len(self._ids)
+        if need <= cap: return
+        cap = max(need, cap * 2)
+        for k, arr in self._cols.items():
+            self._cols[k] = np.resize(arr, cap)
+        self._ids = np.resize(self._ids, cap)
+
+    def __len__(self):
+        return self._n
+
+    # ---- lectura ----
+    def id(self, i: int) -> int:
+        return int(self._ids[i])
+
+    def ids(self) -> np.ndarray:
+        return self._ids[:self._n]
+
+    def index(self, rid: int) -> int:
+        return int(np.flatnonzero(self.ids() == rid)[0])
+
+    def row(self, i: int) -> dict:
+        return {"cant": int(self._cols["cant"][i]), **{k: float(self._cols[k][i]) for k in self.COLS[1:]}}
+
+    def to_rows(self) -> list[dict]:
+        return [self.row(i) for i in range(self._n)]
+
+    def columns(self) -> dict[str, np.ndarray]:
+        return {k: arr[:self._n] for k, arr in self._cols.items()}
+
+    def bultos(self) -> Bultos:
+        """Vista para el motor de pesos (sin copiar ni re-parsear)."""
+        return Bultos(*(self._cols[k][:self._n] for k in self.COLS))
+
+    @property
+    def nbytes(self) -> int:
+        return self._ids.nbytes + sum(arr.nbytes for arr in self._cols.values())
+
+    # ---- escritura ----
+    def set(self, i: int, row: dict):
+        self._cols["cant"][i] = int(to_float(row.get("cant")))
+        for k in self.COLS[1:]:
+            self._cols[k][i] = to_float(row.get(k))
+
+    def append(self, row: dict | None = None) -> int:
+        self._grow(self._n + 1)
+        i = self._n
+        self._n += 1
+        self._ids[i] = rid = self._next_id
+        self._next_id += 1
+        self.set(i, row or {})
+        return rid
+
+    def pop(self, i: int) -> int:
+        rid = self.id(i)
+        n = self._n
+        for arr in (*self._cols.values(), self._ids):
+            arr[i:n-1] = arr[i+1:n]
+        self._n -= 1
+        return rid
+
+    def replace(self, columns: dict):
+        """Carga masiva (tabla, importación): reemplaza todas las filas en una sola operación.
+        ValueError (sin tocar las filas actuales) si algún valor no es finito o está fuera de rango."""
+        n = len(columns["cant"])
+        cols = {k: np.asarray(columns[k], dtype=np.float64) for k in self.COLS}
+        cols = {k: np.where(np.isnan(v), 0.0, v) for k, v in cols.items()}  # celda vacía = 0, como `to_float`
+        for k, v in cols.items():
+            if not ((v >= 0) & (v <= self.MAXIMOS[k])).all():
+                raise ValueError(f"{k}: los valores tienen que estar entre 0 y {self.MAXIMOS[k]:,.0f}.")
+        self._alloc(max(8, n))
+        for k in self.COLS:
+            self._cols[k][:n] = cols[k]
+        self._ids[:n] = np.arange(self._next_id, self._next_id + n)
+        self._next_id += n
+        self._n = n
+
+    def clear(self):
+        self._n = 0
+        self._alloc(8)
+
+
+class ProductosStore:
+    """Productos en dos columnas de strings, con ids estables como `BultosStore`."""
+
+    COLS = ("descripcion", "link")
+
+    def __init__(self):
+        self._ids: list[int] = []
+        self._cols: dict[str, list[str]] = {k: [] for k in self.COLS}
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def id(self, i: int) -> int:
+        return self._ids[i]
+
+    def ids(self) -> list[int]:
+        return self._ids
+
+    def index(self, rid: int) -> int:
+        return self._ids.index(rid)
+
+    def row(self, i: int) -> dict:
+        return {k: self._cols[k][i] for k in self.COLS}
+
+    def to_rows(self) -> list[dict]:
+        return [self.row(i) for i in range(len(self))]
+
+    def columns(self) -> dict[str, list[str]]:
+        return self._cols
+
+    @property
+    def nbytes(self) -> int:
+        # aproximado: texto + un puntero por celda
+        return sum(len(s) + 8 for col in self._cols.values() for s in col) + 8 * len(self._ids)
+
+    def set(self, i: int, row: dict):
+        for k in self.COLS:
+            if k in row:
+                self._cols[k][i] = row[k] if isinstance(row[k], str) else ""
+
+    def append(self, row: dict | None = None) -> int:
+        row = row or {}
+        rid = self._next_id
+        self._next_id += 1
+        self._ids.append(rid)
+        for k in self.COLS:
+            self._cols[k].append(row[k] if isinstance(row.get(k), str) else "")
+        return rid
+
+    def pop(self, i: int) -> int:
+        for col in self._cols.values():
+            col.pop(i)
+        return self._ids.pop(i)
+
+    def replace(self, rows: list[dict]):
+        self.clear()
+        for r in rows:
+            self.append(r)
+
+    def clear(self):
+        self._ids = []
+        self._cols = {k: [] for k in self.COLS}
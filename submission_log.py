@@ -0,0 +1,136 @@
+# submission_log.py
+# Registro local de solicitudes enviadas: log JSONL append-only + índice SQLite con offsets.
+# El log es la fuente de verdad; el índice sólo guarda (offset, largo) y las claves de búsqueda,
+# así una consulta es un recorrido de B-tree y leer un registro es un slice del archivo mapeado en memoria.
+from __future__ import annotations
+import json, mmap, os, re, sqlite3, threading
+from datetime import date, timedelta
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries(
+  offset INTEGER PRIMARY KEY,
+  length INTEGER NOT NULL,
+  ts TEXT NOT NULL,
+  email TEXT NOT NULL,
+  telefono TEXT NOT NULL,
+  pais TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_ts ON entries(ts);
+CREATE INDEX IF NOT EXISTS entries_email ON entries(email, ts);
+CREATE INDEX IF NOT EXISTS entries_telefono ON entries(telefono, ts);
+CREATE INDEX IF NOT EXISTS entries_pais ON entries(pais, ts);
+"""
+
+
+def norm_email(s: str) -> str:
+    return (s or "").strip().casefold()
+
+
+def norm_telefono(s: str) -> str:
+    # "+54 11 5555-5555" y "541155555555" son el mismo teléfono
+    return re.sub(r"\D", "", s or "")
+
+
+def norm_pais(s: str) -> str:
+    return (s or "").strip().casefold()
+
+
+def _keys(payload: dict) -> tuple[str, str, str, str]:
+    c = payload.get("contacto") or {}
+    return (str(payload.get("timestamp") or ""), norm_email(c.get("email")),
+            norm_telefono(c.get("telefono")), norm_pais(payload.get("pais_origen")))
+
+
+class SubmissionLog:
+    def __init__(self, path: str, index_path: str | None = None):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._fh = open(path, "ab")
+        self._map: mmap.mmap | None = None
+        self._db = sqlite3.connect(index_path or path + ".idx.sqlite3", check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self.reindex()
+
+    # ---- escritura ----
+    def append(self, payload: dict) -> int:
+        """Agrega el payload al log y lo indexa. Devuelve su offset (id estable del registro)."""
+        line = (json.dumps(payload, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            offset = self._fh.seek(0, os.SEEK_END)
+            self._fh.write(line)
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self._db.execute("INSERT OR IGNORE INTO entries VALUES (?,?,?,?,?,?)", (offset, len(line), *_keys(payload)))
+        return offset
+
+    def reindex(self) -> int:
+        """Indexa lo que esté en el log y no en el índice (p.ej. si el proceso murió entre ambas escrituras)."""
+        with self._lock:
+            last = self._db.execute("SELECT offset, length FROM entries ORDER BY offset DESC LIMIT 1").fetchone()
+            start = last[0] + last[1] if last else 0
+            n = 0
+            with open(self.path, "rb") as f:
+                f.seek(start)
+                offset = start
+                self._db.execute("BEGIN")
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # línea a medio escribir (el proceso murió en el append): nunca se confirmó, se descarta
+                        self._fh.truncate(offset)
+                        break
+                    try:
+                        keys = _keys(json.loads(line))
+                    except ValueError:
+                        keys = None
+                    if keys:
+                        self._db.execute("INSERT OR IGNORE INTO entries VALUES (?,?,?,?,?,?)", (offset, len(line), *keys))
+                        n += 1
+                    offset += len(line)
+                self._db.execute("COMMIT")
+            return n
+
+    # ---- lectura ----
+    def _read(self, offset: int, length: int) -> dict:
+        # el mapa se rehace sólo cuando el archivo creció más allá de lo mapeado
+        if self._map is None or offset + length > len(self._map):
+            if self._map is not None:
+                self._map.close()
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return json.loads(self._map[offset:offset + length])
+
+    def get(self, offset: int) -> dict | None:
+        with self._lock:
+            row = self._db.execute("SELECT offset, length FROM entries WHERE offset = ?", (offset,)).fetchone()
+            return self._read(*row) if row else None
+
+    def search(self, email: str = "", telefono: str = "", pais: str = "",
+               desde: date | None = None, hasta: date | None = None,
+               limit: int = 50, cursor: tuple[str, int] | None = None) -> tuple[list[tuple[int, dict]], tuple[str, int] | None]:
+        """Registros más recientes primero, filtrados por cualquier combinación de claves.
+        Paginación por cursor (ts, offset) del último registro devuelto: cada página es O(log n + limit)."""
+        where, args = [], []
+        if email: where.append("email = ?"); args.append(norm_email(email))
+        if telefono: where.append("telefono = ?"); args.append(norm_telefono(telefono))
+        if pais: where.append("pais = ?"); args.append(norm_pais(pais))
+        if desde: where.append("ts >= ?"); args.append(desde.isoformat())
+        if hasta: where.append("ts < ?"); args.append((hasta + timedelta(days=1)).isoformat())
+        # row value: SQLite lo planea como rango sobre el índice (un OR de ts/offset lo recorre desde el principio)
+        if cursor: where.append("(ts, offset) < (?, ?)"); args += [cursor[0], cursor[1]]
+        sql = ("SELECT offset, length, ts FROM entries" + (" WHERE " + " AND ".join(where) if where else "")
+               + " ORDER BY ts DESC, offset DESC LIMIT ?")
+        with self._lock:
+            rows = self._db.execute(sql, (*args, limit + 1)).fetchall()
+            page = [(off, self._read(off, length)) for off, length, _ in rows[:limit]]
+        nxt = (rows[limit - 1][2], rows[limit - 1][0]) if len(rows) > limit else None
+        return page, nxt
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+            self._fh.close()
+            self._db.close()
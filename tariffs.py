@@ -0,0 +1,141 @@
+# tariffs.py
+# Tarifario local: precio estimado al instante, sin esperar la vuelta por n8n.
+# El archivo JSON (formato en assets/tarifas.example.json) se compila a un índice ordenado por origen;
+# buscar el tramo de un peso es un bisect (O(log n)) y el precio queda memoizado.
+from __future__ import annotations
+import bisect, functools, json, math, os, threading, time
+from dataclasses import dataclass
+
+DEFAULT_ORIGEN = "*"  # tarifa para los países sin entrada propia
+
+
+@dataclass(frozen=True)
+class Estimacion:
+    origen: str
+    peso_kg: float           # peso cotizado (aplicable, redondeado según el tarifario)
+    tramo_hasta_kg: float
+    base: float
+    recargos: tuple[tuple[str, float], ...]
+    total: float
+    moneda: str
+    version: str
+
+    def to_dict(self) -> dict:
+        return {
+            "origen": self.origen, "peso_kg": self.peso_kg, "tramo_hasta_kg": self.tramo_hasta_kg,
+            "base": self.base, "recargos": [{"nombre": n, "monto": m} for n, m in self.recargos],
+            "total": self.total, "moneda": self.moneda, "version": self.version,
+        }
+
+
+def _key(pais: str) -> str:
+    return (pais or "").strip().casefold()
+
+
+def _recargos(items: list[dict]) -> tuple[tuple[str, float, float], ...]:
+    return tuple((r["nombre"], float(r.get("pct", 0.0)), float(r.get("fijo", 0.0))) for r in items)
+
+
+class TariffIndex:
+    """Tarifario compilado e inmutable. `price` está memoizado por instancia: recargar descarta la cache."""
+
+    def __init__(self, data: dict, version: str = ""):
+        self.moneda = data.get("moneda", "USD")
+        self.redondeo = float(data.get("redondeo_kg", 0.0))
+        self.version = version or str(data.get("version", ""))
+        recargos = _recargos(data.get("recargos", []))
+        self._origenes: dict[str, tuple[str, list[float], list[tuple[float, float, float]], tuple]] = {}
+        for nombre, o in data["origenes"].items():
+            tramos = sorted(o["tramos"], key=lambda t: float(t["hasta_kg"]))
+            if not tramos:
+                raise ValueError(f"origen {nombre!r} sin tramos")
+            limites = [float(t["hasta_kg"]) for t in tramos]
+            if len(set(limites)) != len(limites):
+                raise ValueError(f"origen {nombre!r}: tramos repetidos")
+            valores = [(float(t.get("por_kg", 0.0)), float(t.get("fijo", 0.0)), float(t.get("minimo", 0.0))) for t in tramos]
+            self._origenes[_key(nombre)] = (nombre, limites, valores, recargos + _recargos(o.get("recargos", [])))
+        self.price = functools.lru_cache(maxsize=4096)(self._price)
+
+    @classmethod
+    def load(cls, path: str) -> "TariffIndex":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        st = os.stat(path)
+        return cls(data, version=str(data.get("version") or st.st_mtime_ns))
+
+    def origenes(self) -> list[str]:
+        return [o[0] for o in self._origenes.values()]
+
+    def origen(self, pais: str) -> str | None:
+        """Tabla que aplica a `pais` (la propia o la de DEFAULT_ORIGEN); None si no hay ninguna."""
+        entry = self._origenes.get(_key(pais)) or self._origenes.get(DEFAULT_ORIGEN)
+        return entry[0] if entry else None
+
+    def estimate(self, pais: str, peso_kg: float) -> Estimacion | None:
+        """Precio para `peso_kg` desde `pais`; None si no hay peso o supera el último tramo."""
+        # el redondeo del tarifario va antes de la cache: pesos del mismo escalón comparten entrada
+        peso = float(peso_kg)
+        peso = math.ceil(peso / self.redondeo - 1e-9) * self.redondeo if self.redondeo else round(peso, 3)
+        return self.price((pais or "").strip(), peso)
+
+    def _price(self, pais: str, peso: float) -> Estimacion | None:
+        entry = self._origenes.get(_key(pais)) or self._origenes.get(DEFAULT_ORIGEN)
+        if entry is None or peso <= 0:
+            return None
+        nombre, limites, valores, recargos = entry
+        i = bisect.bisect_left(limites, peso)
+        if i == len(limites):
+            return None
+        por_kg, fijo, minimo = valores[i]
+        base = round(max(fijo + por_kg * peso, minimo), 2)
+        montos = tuple((n, round(base * pct / 100 + f, 2)) for n, pct, f in recargos)
+        return Estimacion(
+            origen=pais if nombre == DEFAULT_ORIGEN else nombre, peso_kg=round(peso, 3), tramo_hasta_kg=limites[i],
+            base=base, recargos=montos, total=round(base + sum(m for _, m in montos), 2), moneda=self.moneda, version=self.version,
+        )
+
+
+class TariffBook:
+    """Tarifario con recarga en caliente: si el archivo cambia se recompila sin reiniciar la app.
+    Mira el mtime como mucho cada `check_every` segundos; un archivo roto deja vigente el índice anterior."""
+
+    def __init__(self, path: str, check_every: float = 2.0):
+        self.path = path
+        self.check_every = check_every
+        self.error: str | None = None
+        self.reloads = 0
+        self._index: TariffIndex | None = None
+        self._stamp: tuple | None = None
+        self._checked = -math.inf
+        self._lock = threading.Lock()
+        self.index()
+
+    def index(self) -> TariffIndex | None:
+        now = time.monotonic()
+        if now - self._checked < self.check_every:
+            return self._index
+        with self._lock:
+            self._checked = now
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                self.error = f"No se encontró el tarifario {self.path}"
+                return self._index
+            stamp = (st.st_mtime_ns, st.st_size)
+            if stamp != self._stamp:
+                try:
+                    self._index = TariffIndex.load(self.path)
+                    self.error = None
+                    self.reloads += 1
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    self.error = f"Tarifario inválido ({self.path}): {e}"
+                self._stamp = stamp
+            return self._index
+
+    def origen(self, pais: str) -> str | None:
+        idx = self.index()
+        return idx.origen(pais) if idx else None
+
+    def estimate(self, pais: str, peso_kg: float) -> Estimacion | None:
+        idx = self.index()
+        return idx.estimate(pais, peso_kg) if idx else None
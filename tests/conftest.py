@@ -0,0 +1,64 @@
+# tests/conftest.py
+# Los módulos viven en la raíz del repo (sin paquete): se agrega al path como hacen los scripts de bench/.
+from __future__ import annotations
+import json, os, sys, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class Webhook:
+    """Webhook de mentira: responde según `codes[path]` (una lista se consume en orden, el último se repite)
+    y guarda cada POST como (path, headers, body)."""
+
+    def __init__(self):
+        self.codes: dict[str, int | list[int]] = {}
+        self.delay: dict[str, float] = {}
+        self.requests: list[tuple[str, dict, object]] = []
+        self.active: dict[str, int] = {}
+        self.max_active: dict[str, int] = {}
+        self._lock = threading.Lock()
+        hook = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                with hook._lock:
+                    hook.requests.append((self.path, dict(self.headers), body))
+                    hook.active[self.path] = hook.active.get(self.path, 0) + 1
+                    hook.max_active[self.path] = max(hook.max_active.get(self.path, 0), hook.active[self.path])
+                    code = hook.codes.get(self.path, 200)
+                    if isinstance(code, list):
+                        code = code.pop(0) if len(code) > 1 else code[0]
+                if self.path in hook.delay:
+                    threading.Event().wait(hook.delay[self.path])
+                with hook._lock:
+                    hook.active[self.path] -= 1
+                self.send_response(code)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def url(self, path: str) -> str:
+        return self.base + path
+
+    def hits(self, path: str) -> list:
+        with self._lock:
+            return [r for r in self.requests if r[0] == path]
+
+
+@pytest.fixture
+def webhook():
+    hook = Webhook()
+    yield hook
+    hook.server.shutdown()
+    hook.server.server_close()
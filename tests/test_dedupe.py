@@ -0,0 +1,59 @@
+# tests/test_dedupe.py
+# Idempotencia: la key se libera si la solicitud no llegó a guardarse, así el reintento no se descarta.
+from __future__ import annotations
+import os, time
+
+import pytest
+
+from dedupe import DedupeCache, idempotency_key
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_forget_libera_la_key():
+    cache = DedupeCache(ttl=60)
+    assert not cache.seen("k")
+    assert cache.seen("k")
+    cache.forget("k")
+    assert not cache.seen("k")
+    cache.forget("nunca-vista")  # no falla
+
+
+def test_key_ignora_timestamp():
+    a = {"timestamp": "1", "contacto": {"email": "a@b.com"}}
+    assert idempotency_key(a) == idempotency_key({**a, "timestamp": "2"})
+
+
+def _completar(at):
+    at.text_input[0].input("Juan")
+    at.text_input[1].input("j@x.com")
+    at.text_input[2].input("11")
+    at.text_area[0].input("cosa")
+    at.text_area[1].input("https://x")
+    for w, v in zip(at.number_input[:4], (2, 10, 10, 10)):
+        w.set_value(v)
+    at.run()
+
+
+def test_reintento_pasa_si_el_outbox_fallo(webhook, tmp_path, monkeypatch):
+    AppTest = pytest.importorskip("streamlit.testing.v1").AppTest
+    monkeypatch.setenv("N8N_WEBHOOK_URL", webhook.url("/hook"))
+    monkeypatch.setenv("GT_SUBMISSIONS_PATH", str(tmp_path / "submissions.jsonl"))
+    monkeypatch.setenv("GT_OUTBOX_PATH", "/proc/no-existe/outbox.sqlite3")
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    at.run()
+    _completar(at)
+
+    at.button(key="gt_submit_btn").click().run()
+    assert [e.value for e in at.error] == ["No pudimos guardar tu solicitud. Probá de nuevo en unos minutos."]
+    assert not at.session_state["show_dialog"]
+
+    # el disco vuelve: la misma solicitud tiene que entrar, no quedar descartada como duplicado
+    monkeypatch.setenv("GT_OUTBOX_PATH", str(tmp_path / "outbox.sqlite3"))
+    at.button(key="gt_submit_btn").click().run()
+    assert not at.exception and not at.error
+    assert at.session_state["show_dialog"]
+    deadline = time.monotonic() + 10
+    while not webhook.hits("/hook") and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert len(webhook.hits("/hook")) == 1
@@ -0,0 +1,97 @@
+# tests/test_delivery.py
+# WebhookSender: tope de concurrencia por endpoint, reintentos por DelayQueue, 4xx permanentes y breaker.
+from __future__ import annotations
+import time
+
+import pytest
+
+from delivery import DeliveryConfig, Entrega, WebhookSender
+
+
+@pytest.fixture
+def sender():
+    made = []
+
+    def make(**kw) -> WebhookSender:
+        s = WebhookSender(DeliveryConfig(**{"backoff_base": 0.05, "backoff_max": 0.2, "breaker_threshold": 100, **kw}))
+        made.append(s)
+        return s
+    yield make
+    for s in made:
+        s.shutdown()
+
+
+def test_concurrencia_por_endpoint_debajo_de_workers(webhook, sender):
+    s = sender(workers=4)
+    webhook.delay["/lento"] = 0.2
+    lentos = [s.submit(webhook.url("/lento"), {"i": i}) for i in range(8)]
+    time.sleep(0.05)
+    # con el endpoint lento saturado queda un worker libre para los demás
+    t0 = time.perf_counter()
+    assert s.submit(webhook.url("/rapido"), {}).result(timeout=5).ok
+    assert time.perf_counter() - t0 < 0.15
+    assert all(f.result(timeout=10).ok for f in lentos)
+    assert webhook.max_active["/lento"] == 3
+    assert s.inflight() == 0
+
+
+@pytest.mark.parametrize("workers, pedido, tope", [(4, 0, 3), (4, 10, 3), (4, 2, 2), (1, 0, 1)])
+def test_tope_de_concurrencia_configurado(sender, workers, pedido, tope):
+    assert sender(workers=workers, max_concurrent_per_endpoint=pedido)._cap == tope
+
+
+def test_reintenta_5xx_hasta_entregar(webhook, sender):
+    s = sender(max_retries=3)
+    webhook.codes["/flaky"] = [500, 503, 200]
+    assert s.submit(webhook.url("/flaky"), {"a": 1}).result(timeout=5) == Entrega(True, "HTTP 200")
+    assert len(webhook.hits("/flaky")) == 3
+
+
+def test_agota_reintentos(webhook, sender):
+    s = sender(max_retries=2)
+    webhook.codes["/caido"] = 500
+    res = s.submit(webhook.url("/caido"), {}).result(timeout=5)
+    assert (res.ok, res.permanente) == (False, False)
+    assert len(webhook.hits("/caido")) == 3
+
+
+def test_backoff_no_ocupa_workers(webhook, sender):
+    # un solo lugar por endpoint y backoff largo: si el reintento durmiera en el worker, el otro envío esperaría
+    s = sender(workers=2, max_retries=1, backoff_base=1.0, backoff_max=1.0)
+    webhook.codes["/flaky"] = [500, 200]
+    fut = s.submit(webhook.url("/flaky"), {})
+    time.sleep(0.1)
+    t0 = time.perf_counter()
+    assert s.submit(webhook.url("/otro"), {}).result(timeout=5).ok
+    assert time.perf_counter() - t0 < 0.5
+    assert not fut.done()
+    assert fut.result(timeout=5).ok
+
+
+@pytest.mark.parametrize("code, permanente", [(400, True), (404, True), (422, True), (401, False), (403, False), (429, False)])
+def test_4xx(webhook, sender, code, permanente):
+    s = sender(max_retries=1)
+    webhook.codes["/x"] = code
+    res = s.submit(webhook.url("/x"), {}).result(timeout=5)
+    assert (res.ok, res.permanente) == (False, permanente)
+    assert len(webhook.hits("/x")) == (1 if permanente else 2)
+
+
+def test_breaker_abre_y_descarta(webhook, sender):
+    s = sender(max_retries=0, breaker_threshold=2, breaker_cooldown=60)
+    webhook.codes["/caido"] = 500
+    for _ in range(2):
+        assert not s.submit(webhook.url("/caido"), {}).result(timeout=5).ok
+    assert s.breakers_open() == [webhook.url("/caido")]
+    assert s.submit(webhook.url("/caido"), {}) is None
+    assert len(webhook.hits("/caido")) == 2
+
+
+def test_shutdown_resuelve_reintentos_pendientes(webhook, sender):
+    s = sender(max_retries=3, backoff_base=5.0, backoff_max=5.0)
+    webhook.codes["/caido"] = 500
+    futs = [s.submit(webhook.url("/caido"), {"i": i}) for i in range(3)]
+    time.sleep(0.2)
+    s.shutdown()
+    assert [f.result(timeout=2).msg for f in futs] == ["envío cancelado al apagar"] * 3
+    assert s.inflight() == 0
@@ -0,0 +1,108 @@
+# tests/test_outbox.py
+# OutboxFlusher contra un webhook de mentira: lote en un solo POST, 4xx a outbox_dead, 5xx reprogramado.
+from __future__ import annotations
+import json
+
+import pytest
+
+from delivery import DeliveryConfig, WebhookSender
+from outbox import Outbox, OutboxFlusher
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    ob = Outbox(str(tmp_path / "outbox.sqlite3"))
+    yield ob
+    ob.close()
+
+
+@pytest.fixture
+def flusher(outbox):
+    made = []
+
+    def make(**kw) -> OutboxFlusher:
+        sender = WebhookSender(DeliveryConfig(max_retries=0, breaker_threshold=100))
+        # intervalo largo: el hilo hace una pasada al arrancar (outbox vacío) y el test llama a flush()
+        f = OutboxFlusher(outbox, sender, interval=3600, **kw)
+        made.append(f)
+        return f
+    yield make
+    for f in made:
+        f.stop(timeout=5)
+        f.sender.shutdown()
+
+
+def _row(outbox, id_):
+    return outbox._db.execute("SELECT attempts, next_try FROM outbox WHERE id = ?", (id_,)).fetchone()
+
+
+def test_batch_un_post_por_url(webhook, outbox, flusher):
+    f = flusher(batch=True, batch_size=10, auth=lambda: {"Authorization": "Bearer t"})
+    for i in range(3):
+        outbox.append(webhook.url("/hook"), {"i": i}, idem_key=f"k{i}")
+    assert f.flush() == 3
+    (path, headers, body), = webhook.hits("/hook")
+    assert body == [{"i": 0}, {"i": 1}, {"i": 2}]
+    assert headers["Authorization"] == "Bearer t"
+    assert headers["Idempotency-Key"]
+    assert outbox.depth() == 0
+
+
+def test_batch_reintento_repite_la_key(webhook, outbox, flusher):
+    f = flusher(batch=True)
+    webhook.codes["/hook"] = [500, 200]
+    for i in range(2):
+        outbox.append(webhook.url("/hook"), {"i": i}, idem_key=f"k{i}")
+    assert f.flush() == 0
+    outbox._db.execute("UPDATE outbox SET next_try = 0")
+    assert f.flush() == 2
+    keys = [h["Idempotency-Key"] for _, h, _ in webhook.hits("/hook")]
+    assert len(keys) == 2 and keys[0] == keys[1]
+
+
+def test_4xx_pasa_a_outbox_dead_sin_trabar_la_cola(webhook, outbox, flusher):
+    f = flusher()
+    webhook.codes["/malo"] = 422
+    malo = outbox.append(webhook.url("/malo"), {"x": 1})
+    outbox.append(webhook.url("/hook"), {"x": 2})
+    assert f.flush() == 1
+    assert (outbox.depth(), outbox.dead()) == (0, 1)
+    # corregido el webhook, `revive` lo vuelve a encolar y sale en la próxima pasada
+    webhook.codes["/malo"] = 200
+    assert outbox.revive([malo]) == 1
+    assert f.flush() == 1
+    assert (outbox.depth(), outbox.dead()) == (0, 0)
+
+
+def test_5xx_queda_en_cola_con_backoff(webhook, outbox, flusher):
+    f = flusher()
+    webhook.codes["/hook"] = 503
+    id_ = outbox.append(webhook.url("/hook"), {"x": 1})
+    assert f.flush() == 0
+    attempts, next_try = _row(outbox, id_)
+    assert attempts == 1 and next_try > 0
+    assert outbox.due(10) == []  # no se reintenta antes de que venza el backoff
+    assert outbox.dead() == 0
+
+
+def test_401_no_es_permanente(webhook, outbox, flusher):
+    f = flusher(auth=lambda: {"Authorization": "Bearer viejo"})
+    webhook.codes["/hook"] = 401
+    outbox.append(webhook.url("/hook"), {"x": 1})
+    assert f.flush() == 0
+    assert (outbox.depth(), outbox.dead()) == (1, 0)
+
+
+def test_el_token_no_se_guarda(webhook, outbox):
+    outbox.append(webhook.url("/hook"), {"x": 1}, headers={"Authorization": "Bearer t", "X-A": "1"})
+    (headers,), = outbox._db.execute("SELECT headers FROM outbox").fetchall()
+    assert json.loads(headers) == {"X-A": "1"}
+
+
+def test_dead_letter_fallido_no_deja_la_transaccion_abierta(outbox):
+    id_ = outbox.append("http://x", {"x": 1})
+    outbox._db.execute("DROP TABLE outbox_dead")
+    with pytest.raises(Exception):
+        outbox.dead_letter([id_], "HTTP 400")
+    assert not outbox._db.in_transaction
+    assert outbox.depth() == 1
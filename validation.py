@@ -0,0 +1,75 @@
+# validation.py
+# Validación incremental del formulario: el resultado de cada campo queda en cache hasta que cambia su valor,
+# y las filas se cuentan al editarlas (como PesosIncrementales). Armar la lista de errores no recorre el form.
+# Las reglas son las de quoting: mismos errores (ErrorValidacion) que la validación completa de batch.py.
+from __future__ import annotations
+
+from quoting import (ErrorValidacion, error_bultos, error_email, error_nombre, error_pais, error_productos,
+                     error_telefono, producto_valido, to_float)
+
+REGLAS = {
+    "nombre": error_nombre,
+    "email": error_email,
+    "telefono": error_telefono,
+    "pais": lambda v: error_pais(*v),  # (pais_origen, pais_origen_otro)
+}
+
+
+def estado_bulto(r: dict | None) -> tuple[bool, bool]:
+    """(válida, con piezas) de una fila; una fila inexistente no cuenta."""
+    if r is None:
+        return False, False
+    con_piezas = to_float(r.get("cant")) > 0
+    return con_piezas and sum(to_float(r.get(k)) for k in ("ancho", "alto", "largo")) > 0, con_piezas
+
+
+class ValidacionIncremental:
+    """Estado de validación de una sesión. Editar un campo o una fila cuesta O(1);
+    las cargas masivas (tabla, importación, vaciar) recalculan su lista de forma vectorizada."""
+
+    def __init__(self, bultos=None, productos=None):
+        self._campos: dict[str, tuple[object, ErrorValidacion | None]] = {}
+        self.bultos_validos = 0
+        self.productos_validos = 0
+        self.evaluadas = 0                # reglas de campo evaluadas (no servidas de la cache)
+        if bultos is not None: self.cargar_bultos(bultos)
+        if productos is not None: self.cargar_productos(productos)
+
+    # ---- campos ----
+    def campo(self, nombre: str, valor) -> ErrorValidacion | None:
+        hit = self._campos.get(nombre)
+        if hit is not None and hit[0] == valor:
+            return hit[1]
+        self.evaluadas += 1
+        err = REGLAS[nombre](valor)
+        self._campos[nombre] = (valor, err)
+        return err
+
+    # ---- filas ----
+    def bulto(self, old: dict | None, new: dict | None):
+        """Quien edita la fila pasa los valores anteriores y los nuevos (None = fila que no existía / se borró)."""
+        self.bultos_validos += estado_bulto(new)[0] - estado_bulto(old)[0]
+
+    def producto(self, old: dict | None, new: dict | None):
+        self.productos_validos += bool(new and producto_valido(new)) - bool(old and producto_valido(old))
+
+    def cargar_bultos(self, store):
+        c = store.columns()
+        self.bultos_validos = int(((c["cant"] > 0) & ((c["ancho"] + c["alto"] + c["largo"]) > 0)).sum())
+
+    def cargar_productos(self, store):
+        self.productos_validos = sum(producto_valido(r) for r in store.to_rows())
+
+    # ---- resultado ----
+    def errores(self, f: dict) -> list[ErrorValidacion]:
+        """Mismos errores y en el mismo orden que `quoting.validar`, a partir del estado acumulado.
+        Los topes del courier (peso por bulto, valor) son avisos y no bloquean: ver `quoting.avisos`."""
+        errs = [
+            self.campo("nombre", f.get("nombre")),
+            self.campo("email", f.get("email")),
+            self.campo("telefono", f.get("telefono")),
+            error_productos(self.productos_validos > 0),
+            self.campo("pais", (f.get("pais_origen", "China"), f.get("pais_origen_otro"))),
+            error_bultos(self.bultos_validos > 0),
+        ]
+        return [e for e in errs if e]